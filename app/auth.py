@@ -1,17 +1,41 @@
 #auth.py
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from jose import jwt
 from app.config import settings
 
-def create_access_token(subject: str, expires_delta: int = None):
+def create_access_token(subject: str, expires_delta: int = None, token_type: str = "access"):
     expire = datetime.utcnow() + timedelta(minutes=expires_delta or settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode = {"exp": expire, "sub": str(subject)}
+    # jti identifies the token for revocation and the refresh-token store
+    to_encode = {"exp": expire, "sub": str(subject), "type": token_type, "jti": uuid.uuid4().hex}
     encoded = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded
 
+def create_refresh_token(subject: str):
+    return create_access_token(subject, settings.REFRESH_TOKEN_EXPIRE_MINUTES, token_type="refresh")
+
+# Verified payloads keyed by the raw token, kept until the token expires so
+# repeated requests with the same token skip the HMAC check. Only used from
+# the event loop (callers are async), so it needs no lock
+_decoded_tokens = OrderedDict()
+
 def decode_token(token: str):
+    cached = _decoded_tokens.get(token)
+    if cached is not None:
+        if cached["exp"] > time.time():
+            _decoded_tokens.move_to_end(token)
+            return cached
+        del _decoded_tokens[token]
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
     except Exception:
         return None
+
+    if "exp" in payload:
+        _decoded_tokens[token] = payload
+        while len(_decoded_tokens) > settings.TOKEN_CACHE_MAXSIZE:
+            _decoded_tokens.popitem(last=False)
+    return payload
@@ -0,0 +1,268 @@
+# app/cache.py
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from app.config import settings
+from app.logging_config import logger
+
+_redis = None
+
+def get_redis():
+    """Process-wide redis.asyncio client, shared by every router that needs Redis"""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.REDIS_URL)
+    return _redis
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
+
+
+# Left by delete() when tombstones are on; reads treat it as a miss and
+# add() will not replace it until it expires
+_TOMBSTONE = {"_tombstone": True}
+
+
+class LRUCache:
+    """In-process LRU with a per-entry TTL and a bound on the number of entries.
+
+    With `tombstone_ttl` set, delete() leaves a short-lived marker instead of
+    removing the key, and read-through fills use add(), which never replaces
+    an existing entry or marker. A reader that loaded a document before a
+    concurrent write therefore cannot cache the stale copy after the write
+    invalidated it.
+    """
+
+    backend = "memory"
+
+    def __init__(self, maxsize: int, ttl: float, tombstone_ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.tombstone_ttl = tombstone_ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        if value is _TOMBSTONE:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _put(self, key: str, value: dict, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def set(self, key: str, value: dict):
+        self._put(key, value, self.ttl)
+
+    async def add(self, key: str, value: dict) -> bool:
+        """set() unless the key holds a live entry or tombstone; True if stored"""
+        entry = self._data.get(key)
+        if entry is not None and entry[0] >= time.monotonic():
+            return False
+        self._put(key, value, self.ttl)
+        return True
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            if self.tombstone_ttl:
+                self._put(key, _TOMBSTONE, self.tombstone_ttl)
+            else:
+                self._data.pop(key, None)
+
+    async def clear(self):
+        self._data.clear()
+
+    async def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class RedisCache:
+    """Same interface as LRUCache, shared by every worker through Redis.
+
+    The cache is an optimisation, so Redis errors never reach the caller:
+    they are logged and counted, reads become misses and writes are skipped,
+    and requests fall through to Mongo. An invalidation lost this way leaves
+    the old entry until its TTL.
+    """
+
+    backend = "redis"
+
+    def __init__(self, prefix: str, ttl: float, tombstone_ttl: float = 0):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.tombstone_ttl = tombstone_ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _failed(self, operation: str, error: Exception):
+        self.errors += 1
+        logger.warning("cache_error", extra={"fields": {"cache": self.prefix, "operation": operation, "error": str(error)}})
+
+    async def get(self, key: str) -> Optional[dict]:
+        try:
+            raw = await get_redis().get(self.prefix + key)
+        except RedisError as e:
+            self._failed("get", e)
+            raw = None
+        value = json.loads(raw) if raw is not None else None
+        if value is None or value == _TOMBSTONE:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    async def set(self, key: str, value: dict):
+        try:
+            await get_redis().set(self.prefix + key, json.dumps(value), ex=int(self.ttl))
+        except RedisError as e:
+            self._failed("set", e)
+
+    async def add(self, key: str, value: dict) -> bool:
+        # SET NX: atomic across workers
+        try:
+            return bool(await get_redis().set(self.prefix + key, json.dumps(value), ex=int(self.ttl), nx=True))
+        except RedisError as e:
+            self._failed("add", e)
+            return False
+
+    async def delete(self, *keys: str):
+        if not keys:
+            return
+        try:
+            if not self.tombstone_ttl:
+                await get_redis().delete(*(self.prefix + key for key in keys))
+                return
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.set(self.prefix + key, json.dumps(_TOMBSTONE), px=int(self.tombstone_ttl * 1000))
+                await pipe.execute()
+        except RedisError as e:
+            self._failed("delete", e)
+
+    async def clear(self):
+        redis = get_redis()
+        async for key in redis.scan_iter(match=self.prefix + "*", count=1000):
+            await redis.delete(key)
+
+    async def stats(self) -> dict:
+        # Evictions happen inside Redis (maxmemory policy), so ask it
+        try:
+            info = await get_redis().info("stats")
+        except RedisError as e:
+            self._failed("stats", e)
+            info = {}
+        return {
+            "backend": self.backend,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "evictions": info.get("evicted_keys", 0),
+            "expirations": info.get("expired_keys", 0),
+        }
+
+
+class NullCache:
+    backend = "none"
+
+    async def get(self, key: str) -> Optional[dict]:
+        return None
+
+    async def set(self, key: str, value: dict):
+        pass
+
+    async def add(self, key: str, value: dict) -> bool:
+        return False
+
+    async def delete(self, *keys: str):
+        pass
+
+    async def clear(self):
+        pass
+
+    async def stats(self) -> dict:
+        return {"backend": self.backend}
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight call"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, func):
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        task = asyncio.create_task(func())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: a cancelled caller must not cancel the call others wait on
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+
+def make_cache(backend: str, prefix: str, maxsize: int, ttl: float, tombstone_ttl: float = 0):
+    if backend == "memory":
+        return LRUCache(maxsize=maxsize, ttl=ttl, tombstone_ttl=tombstone_ttl)
+    if backend == "redis":
+        return RedisCache(prefix=prefix, ttl=ttl, tombstone_ttl=tombstone_ttl)
+    return NullCache()
+
+
+# Cache of public user documents (user_to_dict output) keyed by user id
+user_cache = make_cache(
+    settings.USER_CACHE_BACKEND,
+    prefix="user:",
+    maxsize=settings.USER_CACHE_MAXSIZE,
+    ttl=settings.USER_CACHE_TTL,
+    tombstone_ttl=settings.CACHE_TOMBSTONE_TTL,
+)
+
+# Authenticated principals (id, name, email, role) keyed by user id. Always
+# in-process: the TTL is short and it only saves a round-trip per request.
+principal_cache = LRUCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAXSIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+    tombstone_ttl=settings.CACHE_TOMBSTONE_TTL,
+)
@@ -0,0 +1,79 @@
+# app/change_stream.py
+import asyncio
+from app.cache import user_cache, principal_cache
+from app.config import settings
+from app.database import mongodb
+from app.logging_config import logger
+from app.serialization import user_cache_entry
+
+
+class UserChangeWatcher:
+    """Tails a change stream on users and keeps this worker's caches coherent.
+
+    Every worker runs its own watcher, so writes made by other workers or
+    other services invalidate the in-process caches everywhere. In "refresh"
+    mode updated documents are written back into the user cache from the
+    post-image instead of just being dropped. Requires a replica set.
+    """
+
+    def __init__(self, collection_name: str, mode: str, retry_delay: float):
+        self.collection_name = collection_name
+        self.mode = mode
+        self.retry_delay = retry_delay
+        self.resume_token = None
+        self.events = 0
+        self._task = None
+
+    async def _apply(self, change: dict):
+        self.events += 1
+        user_id = str(change["documentKey"]["_id"])
+        await principal_cache.delete(user_id)
+        document = change.get("fullDocument")
+        if self.mode == "refresh" and document is not None and change["operationType"] != "delete":
+            # Only public fields are kept, the password hash is dropped
+            await user_cache.set(user_id, user_cache_entry(document))
+        else:
+            await user_cache.delete(user_id)
+
+    async def _run(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        while True:
+            collection = mongodb.get_collection(self.collection_name)
+            try:
+                async with await collection.watch(
+                    pipeline,
+                    full_document="updateLookup" if self.mode == "refresh" else None,
+                    resume_after=self.resume_token,
+                ) as stream:
+                    logger.info("change_stream_open", extra={"fields": {"collection": self.collection_name, "mode": self.mode}})
+                    async for change in stream:
+                        await self._apply(change)
+                        self.resume_token = stream.resume_token
+            except Exception as e:
+                # Changes made while the stream was down are unknown; start
+                # clean rather than trust a resume token that may have expired
+                self.resume_token = None
+                try:
+                    await user_cache.clear()
+                    await principal_cache.clear()
+                except Exception:
+                    pass
+                logger.warning("change_stream_error", extra={"fields": {"error": str(e)}})
+                await asyncio.sleep(self.retry_delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+user_change_watcher = UserChangeWatcher(
+    "users",
+    mode=settings.USER_CHANGE_STREAM_MODE,
+    retry_delay=settings.USER_CHANGE_STREAM_RETRY_DELAY,
+)
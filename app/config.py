@@ -1,5 +1,156 @@
+import os
+
+
 class Settings:
-    MONGODB_URL = "mongodb://localhost:27017"
-    DATABASE_NAME = "web_users"
+    MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    DATABASE_NAME = os.getenv("DATABASE_NAME", "web_users")
+
+    # Serving: worker processes, graceful drain, log level
+    HOST = os.getenv("HOST", "0.0.0.0")
+    PORT = int(os.getenv("PORT", "8000"))
+    WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    # Index reconciliation in each worker's startup; app.serve runs it once
+    # before starting workers and turns this off for them
+    INDEX_RECONCILE_ON_STARTUP = os.getenv("INDEX_RECONCILE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+    # Connection pool shared by every request in the process. Each worker has
+    # its own pool, so the default splits a total budget across workers.
+    MONGODB_TOTAL_POOL_SIZE = int(os.getenv("MONGODB_TOTAL_POOL_SIZE", "100"))
+    MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", str(max(10, MONGODB_TOTAL_POOL_SIZE // WEB_CONCURRENCY))))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+    MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "60000"))
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+    # Driver-level bounds for an unreachable or hung server
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+
+    # Per-request deadline applied to every Mongo operation the request makes
+    # (maxTimeMS) and to the request itself (cancelled, 504). Overrides are
+    # "METHOD /route/template=ms" pairs; 0 disables the deadline for a route.
+    REQUEST_DEADLINE_MS = int(os.getenv("REQUEST_DEADLINE_MS", "5000"))
+    REQUEST_DEADLINES = os.getenv(
+        "REQUEST_DEADLINES",
+        "GET /users/{user_id}=1000,GET /users/=3000,GET /users/count=10000,"
+        "GET /users/export=0,POST /users/bulk=60000,PUT /users/bulk=60000,DELETE /users/bulk=60000",
+    )
+
+    # Circuit breaker on Mongo: opens when, over the last BREAKER_WINDOW seconds
+    # and at least BREAKER_MIN_CALLS commands, the share of failed or slow
+    # commands (over BREAKER_SLOW_CALL_MS, or the issuing route's deadline if
+    # longer; background commands are never slow) reaches BREAKER_FAILURE_RATE; then requests get 503 for
+    # BREAKER_OPEN_SECONDS before BREAKER_HALF_OPEN_CALLS probes are let through
+    BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "true").lower() in ("1", "true", "yes")
+    BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "10"))
+    BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "20"))
+    BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+    BREAKER_SLOW_CALL_MS = float(os.getenv("BREAKER_SLOW_CALL_MS", "1000"))
+    BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "5"))
+    BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "5"))
+
+    # GET /users/ pagination
+    USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "100"))
+    USERS_MAX_PAGE_SIZE = int(os.getenv("USERS_MAX_PAGE_SIZE", "1000"))
+    USERS_STREAM_BATCH_SIZE = int(os.getenv("USERS_STREAM_BATCH_SIZE", "500"))
+
+    # /users/bulk
+    USERS_BULK_BATCH_SIZE = int(os.getenv("USERS_BULK_BATCH_SIZE", "1000"))
+    USERS_BULK_MAX_ITEMS = int(os.getenv("USERS_BULK_MAX_ITEMS", "100000"))
+
+    # /users/export and /users/count
+    USERS_EXPORT_BATCH_SIZE = int(os.getenv("USERS_EXPORT_BATCH_SIZE", "1000"))
+    USERS_EXPORT_MAX_BATCH_SIZE = int(os.getenv("USERS_EXPORT_MAX_BATCH_SIZE", "10000"))
+    USERS_COUNT_CACHE_TTL = float(os.getenv("USERS_COUNT_CACHE_TTL", "60"))
+
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+    # Read-through cache for GET /users/{id}: memory | redis | none
+    USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "memory")
+    USER_CACHE_MAXSIZE = int(os.getenv("USER_CACHE_MAXSIZE", "10000"))
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+    # Invalidated keys hold a marker this long so a read that started before
+    # the write cannot put the old document back (keep above the GET deadline)
+    CACHE_TOMBSTONE_TTL = float(os.getenv("CACHE_TOMBSTONE_TTL", "5"))
+
+    # JWT. There is no default: the app refuses to start without a real key
+    SECRET_KEY = os.getenv("SECRET_KEY", "")
+    ALGORITHM = os.getenv("ALGORITHM", "HS256")
+    ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    REFRESH_TOKEN_EXPIRE_MINUTES = int(os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES", str(60 * 24 * 7)))
+    TOKEN_CACHE_MAXSIZE = int(os.getenv("TOKEN_CACHE_MAXSIZE", "10000"))
+    PRINCIPAL_CACHE_MAXSIZE = int(os.getenv("PRINCIPAL_CACHE_MAXSIZE", "10000"))
+    PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+    # Revoked jtis are mirrored per worker and re-synced from Mongo this often
+    REVOCATION_CHECK_ENABLED = os.getenv("REVOCATION_CHECK_ENABLED", "true").lower() in ("1", "true", "yes")
+    REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", "5"))
+
+    # Password KDF (bcrypt | scrypt) and its dedicated worker pool (thread | process)
+    PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "bcrypt")
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    SCRYPT_ROUNDS = int(os.getenv("SCRYPT_ROUNDS", "16"))
+    PASSWORD_POOL_KIND = os.getenv("PASSWORD_POOL_KIND", "thread")
+    PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", str(max(1, (os.cpu_count() or 2) // WEB_CONCURRENCY))))
+    PASSWORD_POOL_QUEUE_SIZE = int(os.getenv("PASSWORD_POOL_QUEUE_SIZE", "32"))
+
+    # Webhook ingestion: dedup front filter (memory | redis | none) and worker queue
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "webhook-secret")
+    WEBHOOK_DEDUP_BACKEND = os.getenv("WEBHOOK_DEDUP_BACKEND", "memory")
+    WEBHOOK_DEDUP_MAXSIZE = int(os.getenv("WEBHOOK_DEDUP_MAXSIZE", "100000"))
+    WEBHOOK_DEDUP_TTL = int(os.getenv("WEBHOOK_DEDUP_TTL", "86400"))
+    WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+    WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+    WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+    WEBHOOK_RETRY_DELAY = float(os.getenv("WEBHOOK_RETRY_DELAY", "1"))
+    WEBHOOK_SWEEP_INTERVAL = float(os.getenv("WEBHOOK_SWEEP_INTERVAL", "5"))
+    # A claimed event belongs to its worker for this long; handlers are
+    # cancelled at the end of the lease and expired leases are reclaimed
+    WEBHOOK_LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "60"))
+
+    # External weather proxy: upstream, shared client pool, cache freshness windows
+    WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.openweathermap.org/data/2.5/weather")
+    WEATHER_API_KEY = os.getenv("WEATHER_API_KEY", "YOUR_KEY")
+    EXTERNAL_HTTP_TIMEOUT = float(os.getenv("EXTERNAL_HTTP_TIMEOUT", "5"))
+    EXTERNAL_HTTP_MAX_CONNECTIONS = int(os.getenv("EXTERNAL_HTTP_MAX_CONNECTIONS", "100"))
+    EXTERNAL_HTTP_MAX_KEEPALIVE = int(os.getenv("EXTERNAL_HTTP_MAX_KEEPALIVE", "20"))
+    WEATHER_FRESH_TTL = int(os.getenv("WEATHER_FRESH_TTL", "300"))
+    WEATHER_STALE_TTL = int(os.getenv("WEATHER_STALE_TTL", "600"))
+    WEATHER_L1_MAXSIZE = int(os.getenv("WEATHER_L1_MAXSIZE", "1000"))
+    WEATHER_L1_TTL = float(os.getenv("WEATHER_L1_TTL", "5"))
+
+    # Opt-in write-behind for PUT /users/{id}?defer=true
+    USERS_WRITE_BEHIND_ENABLED = os.getenv("USERS_WRITE_BEHIND_ENABLED", "false").lower() in ("1", "true", "yes")
+    USERS_WRITE_BEHIND_MAX_BATCH = int(os.getenv("USERS_WRITE_BEHIND_MAX_BATCH", "500"))
+    USERS_WRITE_BEHIND_INTERVAL = float(os.getenv("USERS_WRITE_BEHIND_INTERVAL", "1"))
+
+    # Auth admission control: "<requests>/<seconds>" per IP and per email,
+    # memory (single process) or redis (shared) backend, per-route concurrency caps
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    AUTH_RATE_LIMIT_IP = os.getenv("AUTH_RATE_LIMIT_IP", "30/60")
+    AUTH_RATE_LIMIT_EMAIL = os.getenv("AUTH_RATE_LIMIT_EMAIL", "5/60")
+    AUTH_LOGIN_MAX_CONCURRENCY = int(os.getenv("AUTH_LOGIN_MAX_CONCURRENCY", "64"))
+    AUTH_REGISTER_MAX_CONCURRENCY = int(os.getenv("AUTH_REGISTER_MAX_CONCURRENCY", "16"))
+    TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() in ("1", "true", "yes")
+    # Proxies in front of the app that each append to X-Forwarded-For
+    TRUSTED_PROXY_HOPS = max(1, int(os.getenv("TRUSTED_PROXY_HOPS", "1")))
+
+    # Read scaling and cross-worker cache coherence (both need a replica set).
+    # Read preference applies to user reads only; writes always go to the primary.
+    MONGODB_READ_PREFERENCE = os.getenv("MONGODB_READ_PREFERENCE", "primary")
+    MONGODB_MAX_STALENESS_SECONDS = int(os.getenv("MONGODB_MAX_STALENESS_SECONDS", "-1"))
+    USER_CHANGE_STREAM_ENABLED = os.getenv("USER_CHANGE_STREAM_ENABLED", "false").lower() in ("1", "true", "yes")
+    USER_CHANGE_STREAM_MODE = os.getenv("USER_CHANGE_STREAM_MODE", "invalidate")
+    USER_CHANGE_STREAM_RETRY_DELAY = float(os.getenv("USER_CHANGE_STREAM_RETRY_DELAY", "2"))
+
+    # Micro-batching of concurrent user-by-id lookups
+    USER_LOADER_ENABLED = os.getenv("USER_LOADER_ENABLED", "true").lower() in ("1", "true", "yes")
+    USER_LOADER_MAX_BATCH = int(os.getenv("USER_LOADER_MAX_BATCH", "100"))
+    USER_LOADER_WAIT_MS = float(os.getenv("USER_LOADER_WAIT_MS", "2"))
+
+    # Response compression, negotiated through Accept-Encoding
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "5"))
 
 settings = Settings()
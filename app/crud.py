@@ -1,43 +1,70 @@
 # app/crud.py
 from bson import ObjectId
-from typing import List, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from typing import List, Optional, Tuple
+from app.config import settings
 from app.models import UserCreate, UserUpdate, UserInDB, UserResponse
-from app.database import get_database
+from app.database import get_database, read_preference
+from app.utils import USER_PROJECTION
+from app.loader import load_user
 
 class UserCRUD:
     def __init__(self):
         self.collection_name = "users"
 
-    async def get_collection(self):
+    async def get_collection(self, read: bool = False):
         database = await get_database()
-        return database[self.collection_name]
+        collection = database[self.collection_name]
+        if read:
+            # Reads may be served by secondaries, see MONGODB_READ_PREFERENCE
+            collection = collection.with_options(read_preference=read_preference())
+        return collection
 
     async def create_user(self, user: UserCreate) -> UserInDB:
         collection = await self.get_collection()
         
-        # Check if email already exists
-        existing_user = await collection.find_one({"email": user.email})
-        if existing_user:
-            raise ValueError("User with this email already exists")
-        
         user_data = UserInDB(**user.dict())
-        result = await collection.insert_one(user_data.dict(by_alias=True))
+        try:
+            await collection.insert_one(user_data.dict(by_alias=True))
+        except DuplicateKeyError:
+            raise ValueError("User with this email already exists")
         
-        # Get the created user
-        created_user = await collection.find_one({"_id": result.inserted_id})
-        return UserInDB(**created_user)
+        return user_data
 
-    async def get_all_users(self) -> List[UserResponse]:
-        collection = await self.get_collection()
-        users = await collection.find().to_list(length=1000)
-        return [UserResponse(**user) for user in users]
+    async def iter_users(self, projection: dict = USER_PROJECTION, batch_size: int = 1000):
+        """Every user in _id order, fetched batch_size documents at a time"""
+        collection = await self.get_collection(read=True)
+        cursor = collection.find({}, projection).sort("_id", 1).batch_size(batch_size)
+        async for user in cursor:
+            yield user
 
-    async def get_user_by_id(self, user_id: str) -> Optional[UserResponse]:
-        collection = await self.get_collection()
+    async def get_all_users(
+        self,
+        limit: int = settings.USERS_PAGE_SIZE,
+        after: Optional[ObjectId] = None,
+        projection: dict = USER_PROJECTION,
+    ) -> Tuple[List[UserResponse], Optional[ObjectId]]:
+        """One keyset page in _id order and the _id to pass as `after` for the next (None at the end).
+
+        Bounded like GET /users/; use iter_users to walk the whole collection.
+        """
+        collection = await self.get_collection(read=True)
+        query = {"_id": {"$gt": after}} if after is not None else {}
+        # One extra document tells us whether there is a next page
+        users = await collection.find(query, projection).sort("_id", 1).limit(limit + 1).to_list(length=limit + 1)
+        next_after = users[limit - 1]["_id"] if len(users) > limit else None
+        return [UserResponse(**user) for user in users[:limit]], next_after
+
+    async def get_user_by_id(self, user_id: str, projection: dict = USER_PROJECTION) -> Optional[UserResponse]:
+        collection = await self.get_collection(read=True)
         if not ObjectId.is_valid(user_id):
             return None
             
-        user = await collection.find_one({"_id": ObjectId(user_id)})
+        if projection is USER_PROJECTION:
+            user = await load_user(ObjectId(user_id))
+        else:
+            user = await collection.find_one({"_id": ObjectId(user_id)}, projection)
         if user:
             return UserResponse(**user)
         return None
@@ -53,21 +80,19 @@ class UserCRUD:
         if not update_data:
             return await self.get_user_by_id(user_id)
         
-        # Check if email is being updated and if it already exists
-        if user_update.email:
-            existing_user = await collection.find_one({
-                "email": user_update.email,
-                "_id": {"$ne": ObjectId(user_id)}
-            })
-            if existing_user:
-                raise ValueError("User with this email already exists")
-
-        await collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": update_data}
-        )
+        try:
+            user = await collection.find_one_and_update(
+                {"_id": ObjectId(user_id)},
+                {"$set": update_data, "$inc": {"version": 1}},
+                projection=USER_PROJECTION,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            raise ValueError("User with this email already exists")
         
-        return await self.get_user_by_id(user_id)
+        if user:
+            return UserResponse(**user)
+        return None
 
     async def delete_user(self, user_id: str) -> bool:
         collection = await self.get_collection()
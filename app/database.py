@@ -1,31 +1,79 @@
-from pymongo import MongoClient
+import os
+from pymongo import AsyncMongoClient
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
 from app.config import settings
-import asyncio
+from app.logging_config import logger
+from app.metrics import CommandMetrics, PoolMetrics
+from app.resilience import BreakerListener
 
 class MongoDB:
     def __init__(self):
         self.client = None
         self.database = None
+        self.pid = None
 
     def connect(self):
+        # A client inherited through fork() shares sockets with the parent and
+        # must not be used; each worker process builds its own
+        if self.client is not None and self.pid != os.getpid():
+            self.client = None
+            self.database = None
+        # The native async client does its I/O on the event loop itself (no
+        # executor threads) and connects lazily, so creating it never blocks
         if self.client is None:
-            self.client = MongoClient(settings.MONGODB_URL)
+            self.client = AsyncMongoClient(
+                settings.MONGODB_URL,
+                maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+                minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+                maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+                waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=settings.MONGODB_CONNECT_TIMEOUT_MS,
+                event_listeners=[CommandMetrics(), PoolMetrics(), BreakerListener()],
+            )
             self.database = self.client[settings.DATABASE_NAME]
-            print("✅ Connected to MongoDB")
+            self.pid = os.getpid()
+            logger.info("mongodb_connected", extra={"fields": {
+                "database": settings.DATABASE_NAME,
+                "max_pool_size": settings.MONGODB_MAX_POOL_SIZE,
+                "workers": settings.WEB_CONCURRENCY,
+            }})
 
     def get_collection(self, collection_name: str):
-        if self.database is None:
+        if self.database is None or self.pid != os.getpid():
             self.connect()
         return self.database[collection_name]
 
-    def close(self):
+    def get_read_collection(self, collection_name: str):
+        """Collection for reads that may be served by secondaries (MONGODB_READ_PREFERENCE)"""
+        return self.get_collection(collection_name).with_options(read_preference=read_preference())
+
+    async def close(self):
         if self.client:
-            self.client.close()
-            print("❌ Disconnected from MongoDB")
+            if self.pid == os.getpid():
+                await self.client.close()
+            self.client = None
+            self.database = None
+            logger.info("mongodb_disconnected")
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def read_preference():
+    mode = READ_PREFERENCES[settings.MONGODB_READ_PREFERENCE]
+    if mode is Primary:
+        return Primary()
+    return mode(max_staleness=settings.MONGODB_MAX_STALENESS_SECONDS)
 
 # Global MongoDB instance
 mongodb = MongoDB()
 
-# Async wrapper for database operations
-async def run_async(func, *args):
-    return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+async def get_database():
+    if mongodb.database is None or mongodb.pid != os.getpid():
+        mongodb.connect()
+    return mongodb.database
@@ -1,25 +1,57 @@
 #deps.py
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from pydantic import BaseModel
+from bson import ObjectId
 from app.auth import decode_token
-from app.crud import get_user
-from app.database import AsyncSessionLocal
+from app.cache import principal_cache
+from app.config import settings
+from app.database import mongodb
+from app.metrics import REVOCATION_REJECTED
+from app.revocation import revoked_tokens
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
-        yield session
+PRINCIPAL_PROJECTION = {"name": 1, "email": 1, "role": 1}
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)):
+class Principal(BaseModel):
+    id: str
+    name: str
+    email: str
+    role: str = "user"
+
+# async so it runs on the event loop: a sync dependency would go to the
+# threadpool and mutate the decoded-token cache from several threads
+async def access_payload(token: str = Depends(oauth2_scheme)) -> dict:
     payload = decode_token(token)
-    if not payload:
+    # Every token we issue carries a jti; one without it cannot be revoked
+    if not payload or payload.get("type", "access") != "access" or "jti" not in payload:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user_id = int(payload.get("sub"))
-    user = await get_user(db, user_id)
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
+    # In-memory check only, no round-trip
+    if settings.REVOCATION_CHECK_ENABLED and revoked_tokens.is_revoked(payload["jti"]):
+        REVOCATION_REJECTED.inc()
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+    return payload
+
+async def get_current_user(payload: dict = Depends(access_payload)) -> Principal:
+    user_id = payload.get("sub")
+    if not user_id or not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+    principal = await principal_cache.get(user_id)
+    if principal is None:
+        collection = mongodb.get_collection("users")
+        user = await collection.find_one({"_id": ObjectId(user_id)}, PRINCIPAL_PROJECTION)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        principal = {
+            "id": str(user["_id"]),
+            "name": user.get("name", ""),
+            "email": user["email"],
+            "role": user.get("role", "user"),
+        }
+        await principal_cache.add(user_id, principal)
+    return Principal(**principal)
 
 def require_admin(user=Depends(get_current_user)):
     if user.role != "admin":
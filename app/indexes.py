@@ -0,0 +1,188 @@
+# app/indexes.py
+from typing import List
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+from app.logging_config import logger
+
+# Declared indexes per collection. Names are explicit so reconciliation can
+# match them against what is already on the server.
+INDEXES = {
+    "users": [
+        # Uniqueness check for create/update/register and lookup for login
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        # Sorting by registration date, keyset tie-break on _id
+        IndexModel([("registration_date", ASCENDING), ("_id", ASCENDING)], name="registration_date_id"),
+        # Equality filter / prefix search / sort on name and surname
+        IndexModel([("name", ASCENDING), ("_id", ASCENDING)], name="name_id"),
+        IndexModel([("surname", ASCENDING), ("_id", ASCENDING)], name="surname_id"),
+        # Word search on either name (search=text)
+        IndexModel([("name", TEXT), ("surname", TEXT)], name="name_surname_text"),
+    ],
+    "webhook_events": [
+        # Idempotency: a provider retry with the same id is rejected by the insert
+        IndexModel([("event_id", ASCENDING)], name="event_id_unique", unique=True),
+        # Sweeper picks up pending events that are due, oldest first
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        # Sweeper reclaims events whose processing lease has expired
+        IndexModel([("status", ASCENDING), ("processing_until", ASCENDING)], name="status_processing_until"),
+    ],
+    "refresh_tokens": [
+        # Expired refresh tokens are removed by the server
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        # Logout of every session of a user
+        IndexModel([("sub", ASCENDING)], name="sub"),
+    ],
+    "revoked_tokens": [
+        # A revocation is only needed until the token would have expired
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        # Incremental sync of per-worker revocation sets
+        IndexModel([("revoked_at", ASCENDING)], name="revoked_at"),
+    ],
+}
+
+
+def _same_spec(existing: dict, model: IndexModel) -> bool:
+    wanted = model.document
+    if "_fts" in dict(existing["key"]):
+        # Text indexes are stored as _fts/_ftsx; the indexed fields are in weights
+        text_fields = {field for field, kind in wanted["key"].items() if kind == TEXT}
+        return set(existing.get("weights", {})) == text_fields
+    return (
+        list(existing["key"]) == list(wanted["key"].items())
+        and bool(existing.get("unique", False)) == bool(wanted.get("unique", False))
+        and existing.get("expireAfterSeconds") == wanted.get("expireAfterSeconds")
+    )
+
+
+# Indexes the app must not serve without: create/update/register rely on
+# the unique index alone to reject duplicate emails
+REQUIRED_INDEXES = {"users": ["email_unique"]}
+
+# Alternate name used while a drifted index is rebuilt next to the old one
+_SWAP_SUFFIX = "_next"
+
+
+def _candidate_names(model: IndexModel) -> tuple:
+    name = model.document["name"]
+    return name, name + _SWAP_SUFFIX
+
+
+def _matching_name(existing: dict, model: IndexModel):
+    """Name under which a declared index is present with the right spec, if any"""
+    for name in _candidate_names(model):
+        if name in existing and _same_spec(existing[name], model):
+            return name
+    return None
+
+
+def _renamed(model: IndexModel, name: str) -> IndexModel:
+    document = dict(model.document)
+    keys = list(document.pop("key").items())
+    document["name"] = name
+    return IndexModel(keys, **document)
+
+
+async def _swap(collection, existing: dict, model: IndexModel):
+    """Rebuild a drifted index without a window where it does not exist.
+
+    The replacement is built under the other candidate name first; the old
+    index is dropped only once the replacement is complete. If the build
+    fails (e.g. duplicates prevent a unique index) the old one is kept.
+    """
+    name, alternate = _candidate_names(model)
+    old = name if name in existing else alternate
+    new = alternate if old == name else name
+    if new in existing:
+        # Leftover of an interrupted swap with the wrong spec
+        await collection.drop_index(new)
+    await collection.create_indexes([_renamed(model, new)])
+    try:
+        await collection.drop_index(old)
+    except OperationFailure:
+        # Another process finished the same swap first
+        pass
+
+
+async def ensure_indexes(database) -> dict:
+    """Create missing indexes and rebuild ones whose spec drifted.
+
+    Safe to run on every startup: indexes that already match are left alone,
+    and a drifted index is replaced by building the new one before dropping
+    the old. serve.py runs this once before starting workers.
+    Returns the same report as index_report().
+    """
+    errors = {}
+    for collection_name, models in INDEXES.items():
+        collection = database[collection_name]
+        existing = await collection.index_information()
+        to_create: List[IndexModel] = []
+        try:
+            for model in models:
+                if _matching_name(existing, model):
+                    continue
+                if any(name in existing for name in _candidate_names(model)):
+                    await _swap(collection, existing, model)
+                    logger.info("index_rebuilt", extra={"fields": {
+                        "collection": collection_name,
+                        "index": model.document["name"],
+                    }})
+                else:
+                    to_create.append(model)
+            if to_create:
+                await collection.create_indexes(to_create)
+                logger.info("indexes_created", extra={"fields": {
+                    "collection": collection_name,
+                    "indexes": [m.document["name"] for m in to_create],
+                }})
+        except OperationFailure as e:
+            # e.g. duplicate emails already stored prevent the unique index
+            errors[collection_name] = str(e)
+            logger.error("index_build_failed", extra={"fields": {"collection": collection_name, "error": str(e)}})
+
+    report = await index_report(database)
+    for collection_name, error in errors.items():
+        report[collection_name]["error"] = error
+    return report
+
+
+async def check_required_indexes(database):
+    """Raise RuntimeError when an index listed in REQUIRED_INDEXES is absent"""
+    missing = []
+    for collection_name, names in REQUIRED_INDEXES.items():
+        existing = await database[collection_name].index_information()
+        by_name = {m.document["name"]: m for m in INDEXES[collection_name]}
+        missing += [
+            f"{collection_name}.{name}" for name in names
+            if not _matching_name(existing, by_name[name])
+        ]
+    if missing:
+        raise RuntimeError(f"Required indexes missing: {', '.join(missing)}")
+
+
+async def index_report(database) -> dict:
+    """Declared vs. present indexes per collection, plus builds in progress"""
+    in_progress = {}
+    try:
+        ops = await database.client.admin.command(
+            "currentOp", {"command.createIndexes": {"$exists": True}}
+        )
+        for op in ops.get("inprog", []):
+            ns = op.get("ns", "")
+            in_progress.setdefault(ns.split(".", 1)[-1], []).append(op.get("msg", "building"))
+    except OperationFailure:
+        # currentOp needs extra privileges; the rest of the report is still useful
+        pass
+
+    report = {}
+    for collection_name, models in INDEXES.items():
+        existing = await database[collection_name].index_information()
+        declared = [m.document["name"] for m in models]
+        report[collection_name] = {
+            "present": sorted(existing),
+            "missing": [
+                name for name, model in zip(declared, models)
+                if not _matching_name(existing, model)
+            ],
+            "building": in_progress.get(collection_name, []),
+        }
+    return report
@@ -0,0 +1,95 @@
+# app/loader.py
+import asyncio
+import time
+import weakref
+from typing import Optional
+from bson import ObjectId
+from app.config import settings
+from app.database import mongodb
+from app.metrics import LOADER_BATCH_SIZE, LOADER_WAIT
+from app.utils import USER_PROJECTION
+
+
+class BatchLoader:
+    """Coalesces concurrent lookups by _id into one find({"_id": {"$in": [...]}}).
+
+    The first lookup opens a batch; it is dispatched after `wait` seconds or
+    as soon as it holds `max_batch` distinct ids. Callers asking for the same
+    id share one future. Missing documents resolve to None.
+    """
+
+    def __init__(self, collection_name: str, projection: dict, max_batch: int, wait: float):
+        self.collection_name = collection_name
+        self.projection = projection
+        self.max_batch = max_batch
+        self.wait = wait
+        self._pending = {}
+        self._opened_at = None
+        self._timer = None
+
+    def load(self, _id: ObjectId) -> "asyncio.Future[Optional[dict]]":
+        future = self._pending.get(_id)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[_id] = future
+        if len(self._pending) == 1:
+            self._opened_at = time.perf_counter()
+            self._timer = loop.call_later(self.wait, self._dispatch)
+        elif len(self._pending) >= self.max_batch:
+            self._dispatch()
+        return future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        LOADER_BATCH_SIZE.observe(len(batch))
+        LOADER_WAIT.observe(time.perf_counter() - self._opened_at)
+        asyncio.get_running_loop().create_task(self._fetch(batch))
+
+    async def _fetch(self, batch: dict):
+        try:
+            collection = mongodb.get_read_collection(self.collection_name)
+            found = {}
+            async for document in collection.find({"_id": {"$in": list(batch)}}, self.projection):
+                found[document["_id"]] = document
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _id, future in batch.items():
+            if not future.done():
+                future.set_result(found.get(_id))
+
+
+# One loader per event loop: futures and timers cannot cross loops
+_loaders = weakref.WeakKeyDictionary()
+
+
+def user_loader() -> BatchLoader:
+    loop = asyncio.get_running_loop()
+    loader = _loaders.get(loop)
+    if loader is None:
+        loader = BatchLoader(
+            "users",
+            projection=USER_PROJECTION,
+            max_batch=settings.USER_LOADER_MAX_BATCH,
+            wait=settings.USER_LOADER_WAIT_MS / 1000,
+        )
+        _loaders[loop] = loader
+    return loader
+
+
+async def load_user(user_id: ObjectId) -> Optional[dict]:
+    """Public-field user document by _id, batched with concurrent lookups when enabled"""
+    if not settings.USER_LOADER_ENABLED:
+        collection = mongodb.get_read_collection("users")
+        return await collection.find_one({"_id": user_id}, USER_PROJECTION)
+    # shield: one caller going away must not cancel the future others share
+    return await asyncio.shield(user_loader().load(user_id))
@@ -0,0 +1,36 @@
+# app/logging_config.py
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+logger = logging.getLogger("app")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, event, pid plus any extra={"fields": {...}}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.utcfromtimestamp(record.created).isoformat() + "Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            "pid": os.getpid(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level: str = "INFO"):
+    if getattr(logger, "_configured", False):
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    logger._configured = True
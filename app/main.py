@@ -1,22 +1,117 @@
 # app/main.py
+import os
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routers import users, auth  # Добавьте auth
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from pymongo.errors import PyMongoError
+from app.routers import users, auth, bulk, export, webhooks, external  # Добавьте auth
 from app.database import mongodb
+from app.indexes import ensure_indexes, index_report, check_required_indexes
+from app.cache import user_cache, principal_cache, close_redis
+from app.passwords import password_hasher
+from app.metrics import metrics_middleware, metrics_response, track_gauge, mark_process_dead
+from app.webhook_queue import webhook_queue
+from app.write_behind import user_write_behind
+from app.change_stream import user_change_watcher
+from app.revocation import revoked_tokens
+from app.resilience import db_breaker
+from app.config import settings
+from app.logging_config import logger, setup_logging
 
-app = FastAPI(title="MongoDB Users API", version="1.0.0")
+setup_logging(settings.LOG_LEVEL)
 
-# Connect to MongoDB on startup
-@app.on_event("startup")
+# Runs in every worker process after it has started (after fork under
+# gunicorn), so each worker builds its own Mongo client and pools
 async def startup_event():
+    logger.info("startup", extra={"fields": {"workers": settings.WEB_CONCURRENCY}})
+    # Tokens signed with a known key can be forged by anyone
+    if settings.SECRET_KEY in ("", "change-me"):
+        raise RuntimeError("SECRET_KEY is not set; refusing to start with a placeholder signing key")
     mongodb.connect()
+    if settings.INDEX_RECONCILE_ON_STARTUP:
+        try:
+            app.state.index_report = await ensure_indexes(mongodb.database)
+        except Exception as e:
+            logger.error("index_bootstrap_failed", extra={"fields": {"error": str(e)}})
+    # Without the unique email index duplicates would be accepted silently;
+    # refuse to start rather than serve writes. An unreachable server proves
+    # nothing, so that only logs: the breaker and deadlines cover the outage
+    try:
+        await check_required_indexes(mongodb.database)
+    except PyMongoError as e:
+        logger.error("index_check_failed", extra={"fields": {"error": str(e)}})
+    await webhook_queue.start()
+    await external.start_http_client()
+    if settings.USERS_WRITE_BEHIND_ENABLED:
+        user_write_behind.start()
+    if settings.USER_CHANGE_STREAM_ENABLED:
+        user_change_watcher.start()
+    if settings.REVOCATION_CHECK_ENABLED:
+        revoked_tokens.start()
+    logger.info("startup_complete")
 
-@app.on_event("shutdown")
+# uvicorn/gunicorn stop accepting and wait up to GRACEFUL_TIMEOUT for open
+# connections, streamed bodies included, before the lifespan shutdown runs
 async def shutdown_event():
-    mongodb.close()
+    logger.info("shutdown")
+    # Flush deferred user updates while the Mongo client is still open
+    await user_write_behind.stop()
+    await user_change_watcher.stop()
+    await revoked_tokens.stop()
+    await webhook_queue.stop()
+    await external.close_http_client()
+    await mongodb.close()
+    await close_redis()
+    password_hasher.shutdown()
+    mark_process_dead(os.getpid())
+    logger.info("shutdown_complete")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup_event()
+    try:
+        yield
+    finally:
+        await shutdown_event()
+
+app = FastAPI(title="MongoDB Users API", version="1.0.0", lifespan=lifespan)
+app.middleware("http")(metrics_middleware)
+
+# Large list and NDJSON responses are compressed when the client accepts it;
+# brotli is used when brotli-asgi is installed, gzip otherwise
+if settings.COMPRESSION_ENABLED:
+    try:
+        from brotli_asgi import BrotliMiddleware
+        app.add_middleware(
+            BrotliMiddleware,
+            minimum_size=settings.COMPRESSION_MIN_SIZE,
+            gzip_fallback=True,
+        )
+    except ImportError:
+        app.add_middleware(
+            GZipMiddleware,
+            minimum_size=settings.COMPRESSION_MIN_SIZE,
+            compresslevel=settings.COMPRESSION_LEVEL,
+        )
+
+track_gauge("password_pool_pending", "KDF jobs running or queued", lambda: password_hasher.pending)
+track_gauge("password_pool_rejected", "KDF jobs shed because the pool was full", lambda: password_hasher.rejected)
+track_gauge("webhook_queue_depth", "Webhook events waiting for a worker", lambda: webhook_queue.queue.qsize())
+track_gauge("write_behind_queue_depth", "Documents with deferred updates waiting for a flush", lambda: user_write_behind.depth)
+track_gauge("token_revocation_set_size", "Revoked token ids mirrored in this worker", lambda: len(revoked_tokens))
+track_gauge("user_cache_hits", "GET /users/{id} cache hits", lambda: getattr(user_cache, "hits", 0))
+track_gauge("user_cache_misses", "GET /users/{id} cache misses", lambda: getattr(user_cache, "misses", 0))
+track_gauge("user_cache_evictions", "In-process user cache evictions", lambda: getattr(user_cache, "evictions", 0))
 
 # Include routers
+app.include_router(bulk.router)  # before users, /users/bulk must not match /users/{user_id}
+app.include_router(export.router)  # likewise /users/export and /users/count
 app.include_router(users.router)
 app.include_router(auth.router)  # Добавьте эту строку
+app.include_router(webhooks.router)
+app.include_router(external.router)
 
 @app.get("/")
 async def root():
@@ -27,4 +122,34 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "database": "MongoDB"}
\ No newline at end of file
+    started = time.perf_counter()
+    try:
+        await mongodb.get_collection("users").database.command("ping")
+    except Exception as e:
+        return JSONResponse(status_code=503, content={
+            "status": "unhealthy",
+            "database": "MongoDB",
+            "error": str(e),
+            "breaker": db_breaker.stats()
+        })
+    return {
+        "status": "healthy",
+        "database": "MongoDB",
+        "db_latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "breaker": db_breaker.stats()
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
+
+@app.get("/health/indexes")
+async def health_indexes():
+    return await index_report(mongodb.database)
+
+@app.get("/health/cache")
+async def health_cache():
+    return {
+        "users": await user_cache.stats(),
+        "principals": await principal_cache.stats()
+    }
\ No newline at end of file
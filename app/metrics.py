@@ -0,0 +1,205 @@
+# app/metrics.py
+import os
+import time
+from fastapi import Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from pymongo import monitoring
+
+# With several workers (app.serve sets PROMETHEUS_MULTIPROC_DIR) every process
+# writes its samples to files in that directory and /metrics aggregates them,
+# whichever worker answers the scrape. Gauges state how to combine workers;
+# the mode is ignored in a single process.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# HTTP
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route"],
+)
+REQUESTS_TOTAL = Counter(
+    "http_requests_total",
+    "Requests by route template and status code",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled", multiprocess_mode="livesum")
+
+# MongoDB
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency as seen by the driver",
+    ["command"],
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongodb_command_failures_total",
+    "MongoDB commands that failed",
+    ["command"],
+)
+MONGO_POOL_CHECKED_OUT = Gauge("mongodb_pool_checked_out", "Connections currently checked out of the pool", multiprocess_mode="livesum")
+MONGO_POOL_WAITING = Gauge("mongodb_pool_wait_queue", "Operations waiting for a pooled connection", multiprocess_mode="livesum")
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures_total",
+    "Connection checkouts that failed or timed out",
+    ["reason"],
+)
+
+# Write-behind queue
+WRITE_BEHIND_FLUSH_LATENCY = Histogram("write_behind_flush_seconds", "Duration of one write-behind bulk_write flush")
+WRITE_BEHIND_FLUSHED = Counter("write_behind_flushed_total", "Deferred updates written")
+WRITE_BEHIND_FAILED = Counter("write_behind_failed_total", "Deferred updates rejected by the server")
+
+# Auth admission control
+ADMISSION_REJECTED = Counter(
+    "auth_admission_rejected_total",
+    "Auth requests rejected before any work",
+    ["route", "reason"],
+)
+
+# Token revocation
+REVOCATION_SYNC_LATENCY = Histogram("token_revocation_sync_seconds", "Duration of one revoked-jti sync from Mongo")
+REVOCATION_REJECTED = Counter("token_revocation_rejected_total", "Requests refused because their token was revoked")
+
+# Deadlines and the Mongo circuit breaker
+DEADLINE_EXCEEDED = Counter(
+    "request_deadline_exceeded_total",
+    "Requests cancelled at their deadline",
+    ["method", "route"],
+)
+BREAKER_STATE = Gauge(
+    "mongodb_breaker_state",
+    "Mongo circuit breaker, worst worker: 0 closed, 1 half-open, 2 open",
+    multiprocess_mode="livemax",
+)
+BREAKER_REJECTED = Counter("mongodb_breaker_rejected_total", "Requests refused while the breaker was open")
+BREAKER_TRANSITIONS = Counter("mongodb_breaker_transitions_total", "Breaker state changes", ["state"])
+
+# Batched user-by-id loader
+LOADER_BATCH_SIZE = Histogram(
+    "user_loader_batch_size",
+    "Distinct ids per batched $in lookup",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+LOADER_WAIT = Histogram(
+    "user_loader_wait_seconds",
+    "Time from the first lookup in a batch to its dispatch",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05),
+)
+
+
+def route_label(request: Request) -> str:
+    # Route template (/users/{user_id}) rather than the raw path keeps cardinality bounded
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+async def metrics_middleware(request: Request, call_next):
+    REQUESTS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = route_label(request)
+        REQUEST_LATENCY.labels(request.method, route).observe(time.perf_counter() - started)
+        REQUESTS_TOTAL.labels(request.method, route, str(status_code)).inc()
+        REQUESTS_IN_FLIGHT.dec()
+        refresh_tracked_gauges()
+
+
+def metrics_response() -> Response:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        refresh_tracked_gauges(force=True)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead(pid: int):
+    """Drop a finished worker's live gauges from the aggregate"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Per-command timings reported by the driver itself"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name).inc()
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Checked-out connections and the queue of operations waiting for one"""
+
+    def connection_check_out_started(self, event):
+        MONGO_POOL_WAITING.inc()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_WAITING.dec()
+        MONGO_POOL_CHECKED_OUT.inc()
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_WAITING.dec()
+        MONGO_POOL_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.dec()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+
+_tracked = []
+_tracked_refreshed_at = 0.0
+
+
+def refresh_tracked_gauges(force: bool = False):
+    """Write track_gauge values to this worker's files, at most once a second.
+
+    Callback gauges are not visible across processes, so in multiprocess
+    mode each worker pushes its current values after requests instead.
+    """
+    global _tracked_refreshed_at
+    now = time.monotonic()
+    if not _tracked or (not force and now - _tracked_refreshed_at < 1):
+        return
+    _tracked_refreshed_at = now
+    for gauge, func in _tracked:
+        gauge.set(func())
+
+
+def track_gauge(name: str, documentation: str, func):
+    """Gauge whose value is read from func() at scrape time, summed over live workers"""
+    gauge = Gauge(name, documentation, multiprocess_mode="livesum")
+    if MULTIPROCESS:
+        _tracked.append((gauge, func))
+    else:
+        gauge.set_function(func)
+    return gauge
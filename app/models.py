@@ -1,14 +1,13 @@
 # app/models.py
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, field_validator
+from pydantic_core import core_schema
 from typing import Optional
 from datetime import datetime
 from bson import ObjectId
+from app.serialization import JSON_ENCODERS
+from app.utils import utc_now_ms
 
 class PyObjectId(ObjectId):
-    @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
-
     @classmethod
     def validate(cls, v):
         if not ObjectId.is_valid(v):
@@ -16,8 +15,16 @@ class PyObjectId(ObjectId):
         return ObjectId(v)
 
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        field_schema.update(type="string")
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        # Stays an ObjectId in model_dump() (what Mongo stores), a string in JSON
+        return core_schema.no_info_plain_validator_function(
+            cls.validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(str, when_used="json"),
+        )
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, schema, handler):
+        return {"type": "string"}
 
 class UserBase(BaseModel):
     name: str = Field(..., min_length=2, max_length=50)
@@ -34,19 +41,24 @@ class UserUpdate(BaseModel):
 
 class UserInDB(UserBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
-    registration_date: datetime = Field(default_factory=datetime.utcnow)
+    registration_date: datetime = Field(default_factory=utc_now_ms)
 
     class Config:
         from_attributes = True
         populate_by_name = True
         arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str}
+        json_encoders = JSON_ENCODERS
 
 class UserResponse(UserBase):
     id: str = Field(..., alias="_id")
     registration_date: datetime
 
+    @field_validator("id", mode="before")
+    @classmethod
+    def _id_to_str(cls, value):
+        return str(value) if isinstance(value, ObjectId) else value
+
     class Config:
         from_attributes = True
         populate_by_name = True
-        json_encoders = {ObjectId: str}
\ No newline at end of file
+        json_encoders = JSON_ENCODERS
\ No newline at end of file
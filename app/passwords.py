@@ -0,0 +1,138 @@
+# app/passwords.py
+import asyncio
+import hashlib
+import secrets
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from app.config import settings
+
+# Cost factors come from settings so they can be tuned per deployment.
+# Hashes made with an older cost are flagged by needs_update() and rehashed
+# on the next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt", "scrypt"],
+    default=settings.PASSWORD_SCHEME,
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    scrypt__rounds=settings.SCRYPT_ROUNDS,
+)
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the KDF pool and its queue are full"""
+
+
+def _legacy_verify(plain_password: str, hashed_password: str) -> bool:
+    """Salted SHA-256 hashes ("salt$hexdigest") written before the KDF switch"""
+    try:
+        salt, stored_hash = hashed_password.split('$')
+        computed_hash = hashlib.sha256((plain_password + salt).encode()).hexdigest()
+        return secrets.compare_digest(computed_hash, stored_hash)
+    except Exception:
+        return False
+
+
+def _is_legacy(hashed_password: str) -> bool:
+    return not hashed_password.startswith("$")
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Returns (valid, new_hash); new_hash is set when the stored hash should be replaced"""
+    if _is_legacy(hashed_password):
+        if not _legacy_verify(plain_password, hashed_password):
+            return False, None
+        # Valid either way; failing to rehash just keeps the legacy hash
+        try:
+            return True, pwd_context.hash(plain_password)
+        except (ValueError, TypeError):
+            return True, None
+    try:
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    except (ValueError, TypeError):
+        return False, None
+
+
+# Hash of a random password, built once per process on first use
+_dummy_hash = None
+
+
+def _verify_dummy(plain_password: str) -> bool:
+    """Same KDF cost as a real check, for logins with an unknown email"""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = pwd_context.hash(secrets.token_urlsafe(16))
+    try:
+        pwd_context.verify(plain_password, _dummy_hash)
+    except (ValueError, TypeError):
+        pass
+    return False
+
+
+class PasswordHasher:
+    """Runs KDF work on its own pool so logins never occupy the default executor.
+
+    At most `workers` hashes run at once and `queue_size` more may wait; past
+    that PasswordPoolBusy is raised immediately instead of queueing.
+    """
+
+    def __init__(self, kind: str, workers: int, queue_size: int):
+        self.kind = kind
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="kdf")
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.pending >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise PasswordPoolBusy("Password hashing pool is saturated")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(_verify, plain_password, hashed_password)
+
+    async def verify_dummy(self, plain_password: str) -> bool:
+        """Spend a verification's worth of time; always False (no timing hint for unknown emails)"""
+        return await self._run(_verify_dummy, plain_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": self.pending,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    kind=settings.PASSWORD_POOL_KIND,
+    workers=settings.PASSWORD_POOL_WORKERS,
+    queue_size=settings.PASSWORD_POOL_QUEUE_SIZE,
+)
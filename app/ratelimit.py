@@ -0,0 +1,147 @@
+# app/ratelimit.py
+import math
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+from fastapi import HTTPException, Request
+from app.cache import get_redis
+from app.config import settings
+from app.metrics import ADMISSION_REJECTED
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """"20/60" -> 20 requests per 60 seconds"""
+    limit, window = rate.split("/")
+    return int(limit), float(window)
+
+
+def too_many_requests(retry_after: float, detail: str = "Too many requests"):
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class MemoryRateLimiter:
+    """Token bucket per key, for a single process.
+
+    Holds at most `maxsize` keys; the least recently used bucket is dropped
+    first, which at worst forgives a client that has gone quiet.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window: float) -> Optional[float]:
+        """Take one token; returns seconds to wait when the bucket is empty, else None"""
+        now = time.monotonic()
+        rate = limit / window
+        tokens, updated = self._buckets.get(key, (float(limit), now))
+        tokens = min(float(limit), tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            return (1 - tokens) / rate
+        self._buckets[key] = (tokens - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return None
+
+
+# Sliding window log in a sorted set; atomic so concurrent workers agree
+_SLIDING_WINDOW = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+if redis.call('ZCARD', key) >= limit then
+    local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+    return tostring(tonumber(oldest[2]) + window - now)
+end
+redis.call('ZADD', key, now, ARGV[4])
+redis.call('PEXPIRE', key, math.ceil(window * 1000))
+return false
+"""
+
+
+class RedisRateLimiter:
+    """Sliding window shared by every worker and instance"""
+
+    async def hit(self, key: str, limit: int, window: float) -> Optional[float]:
+        retry_after = await get_redis().eval(
+            _SLIDING_WINDOW, 1, f"ratelimit:{key}", time.time(), window, limit, uuid.uuid4().hex
+        )
+        return float(retry_after) if retry_after else None
+
+
+class ConcurrencyLimiter:
+    """Caps requests in progress per route; over the cap they are rejected, not queued"""
+
+    def __init__(self):
+        self.active = {}
+        self.rejected = {}
+
+    @asynccontextmanager
+    async def slot(self, route: str, limit: int):
+        if self.active.get(route, 0) >= limit:
+            self.rejected[route] = self.rejected.get(route, 0) + 1
+            ADMISSION_REJECTED.labels(route, "concurrency").inc()
+            raise too_many_requests(1, "Too many concurrent requests")
+        self.active[route] = self.active.get(route, 0) + 1
+        try:
+            yield
+        finally:
+            self.active[route] -= 1
+
+
+def client_ip(request: Request) -> str:
+    if settings.TRUST_PROXY_HEADERS:
+        # Entries left of what our own proxies appended come from the client
+        # and can be anything; the one added by the outermost trusted proxy
+        # is the address it actually saw
+        forwarded = [entry.strip() for entry in request.headers.get("x-forwarded-for", "").split(",") if entry.strip()]
+        if len(forwarded) >= settings.TRUSTED_PROXY_HOPS:
+            return forwarded[-settings.TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+if settings.RATE_LIMIT_BACKEND == "redis":
+    rate_limiter = RedisRateLimiter()
+else:
+    rate_limiter = MemoryRateLimiter(maxsize=settings.RATE_LIMIT_MAX_KEYS)
+
+concurrency_limiter = ConcurrencyLimiter()
+
+AUTH_CONCURRENCY = {
+    "login": settings.AUTH_LOGIN_MAX_CONCURRENCY,
+    "register": settings.AUTH_REGISTER_MAX_CONCURRENCY,
+}
+
+
+@asynccontextmanager
+async def auth_admission(route: str, request: Request, email: str):
+    """Admission control for auth routes, checked before any DB or KDF work.
+
+    Rejects with 429 + Retry-After when the per-IP or per-email rate is
+    exceeded, or when the route already has its maximum of requests running.
+    """
+    ip_limit, ip_window = parse_rate(settings.AUTH_RATE_LIMIT_IP)
+    email_limit, email_window = parse_rate(settings.AUTH_RATE_LIMIT_EMAIL)
+
+    retry_after = await rate_limiter.hit(f"{route}:ip:{client_ip(request)}", ip_limit, ip_window)
+    if retry_after is not None:
+        ADMISSION_REJECTED.labels(route, "ip").inc()
+        raise too_many_requests(retry_after)
+    retry_after = await rate_limiter.hit(f"{route}:email:{email.lower()}", email_limit, email_window)
+    if retry_after is not None:
+        ADMISSION_REJECTED.labels(route, "email").inc()
+        raise too_many_requests(retry_after)
+
+    async with concurrency_limiter.slot(route, AUTH_CONCURRENCY[route]):
+        yield
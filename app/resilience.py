@@ -0,0 +1,261 @@
+# app/resilience.py
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from typing import Callable
+import pymongo
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+from app.config import settings
+from app.logging_config import logger
+from app.metrics import BREAKER_REJECTED, BREAKER_STATE, BREAKER_TRANSITIONS, DEADLINE_EXCEEDED
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Cursor batches of change streams and long exports are slow by design
+_NOT_TIMED = {"getMore"}
+
+# Deadline of the request issuing the current Mongo command. Unset in
+# background work (write-behind flushes, webhook workers, index builds),
+# whose commands have no latency target and only count when they fail
+_route_deadline = contextvars.ContextVar("route_deadline", default=None)
+
+# Server error codes that say the database is unavailable or overloaded, as
+# opposed to a bad request (duplicate key, invalid $text query, ...)
+AVAILABILITY_CODES = {
+    6,      # HostUnreachable
+    7,      # HostNotFound
+    50,     # MaxTimeMSExpired
+    89,     # NetworkTimeout
+    91,     # ShutdownInProgress
+    189,    # PrimarySteppedDown
+    262,    # ExceededTimeLimit
+    9001,   # SocketException
+    10107,  # NotWritablePrimary
+    11600,  # InterruptedAtShutdown
+    11602,  # InterruptedDueToReplStateChange
+    13435,  # NotPrimaryNoSecondaryOk
+    13436,  # NotPrimaryOrSecondary
+}
+
+
+def is_availability_failure(failure: dict) -> bool:
+    """Server errors carry a code; driver-side ones (network, timeout) do not"""
+    code = failure.get("code")
+    return code is None or code in AVAILABILITY_CODES
+
+
+def parse_deadlines(spec: str) -> dict:
+    """"GET /users/=3000,POST /users/bulk=60000" -> {("GET", "/users/"): 3.0, ...}"""
+    deadlines = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        route, ms = part.rsplit("=", 1)
+        method, path = route.split()
+        deadlines[(method.upper(), path)] = float(ms) / 1000
+    return deadlines
+
+
+DEADLINES = parse_deadlines(settings.REQUEST_DEADLINES)
+
+
+def deadline_for(method: str, path: str) -> float:
+    """Deadline in seconds for a route template; 0 means none"""
+    return DEADLINES.get((method, path), settings.REQUEST_DEADLINE_MS / 1000)
+
+
+class CircuitBreaker:
+    """Failure/latency breaker over a rolling window of one-second buckets.
+
+    record() is called from the driver's command listener, which may run on
+    other threads, hence the lock. A command counts as bad when it failed
+    for availability reasons or, if timed, took longer than `slow_call` or
+    the deadline of the route that issued it, whichever is longer, so
+    routes allowed to run long (bulk writes, exact counts) are judged
+    against their own budget. Once open, allow() refuses everything
+    for `open_for` seconds, then lets `half_open_calls` requests through:
+    any bad command re-opens the breaker, enough good ones close it.
+    """
+
+    def __init__(self, window: int, min_calls: int, failure_rate: float, slow_call: float,
+                 open_for: float, half_open_calls: int):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.open_for = open_for
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.half_opened_at = 0.0
+        self._buckets = {}
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        self.state = state
+        BREAKER_STATE.set(_STATE_VALUES[state])
+        BREAKER_TRANSITIONS.labels(state).inc()
+        logger.warning("breaker_state", extra={"fields": {"state": state}})
+
+    def _window_counts(self, now: float):
+        oldest = int(now) - self.window
+        for second in [s for s in self._buckets if s <= oldest]:
+            del self._buckets[second]
+        calls = sum(bucket[0] for bucket in self._buckets.values())
+        bad = sum(bucket[1] for bucket in self._buckets.values())
+        return calls, bad
+
+    def record(self, duration: float, ok: bool, timed: bool = True, deadline: float = 0.0):
+        bad = not ok or (timed and duration > max(self.slow_call, deadline))
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN:
+                return
+            if self.state == HALF_OPEN:
+                if bad:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._buckets.clear()
+                        self._transition(CLOSED)
+                return
+            bucket = self._buckets.setdefault(int(now), [0, 0])
+            bucket[0] += 1
+            bucket[1] += bad
+            calls, failures = self._window_counts(now)
+            if calls >= self.min_calls and failures / calls >= self.failure_rate:
+                self._open(now)
+
+    def _open(self, now: float):
+        self.opened_at = now
+        self._buckets.clear()
+        self._transition(OPEN)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now - self.opened_at < self.open_for:
+                    return False
+                self._start_probing(now)
+            elif now - self.half_opened_at >= self.open_for:
+                # Probes that never reached Mongo (e.g. served from cache)
+                # must not leave the breaker half-open forever
+                self._start_probing(now)
+            if self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            return False
+
+    def _start_probing(self, now: float):
+        self.half_opened_at = now
+        self._probes = 0
+        self._probe_successes = 0
+        if self.state != HALF_OPEN:
+            self._transition(HALF_OPEN)
+
+    def retry_after(self) -> float:
+        return max(0.0, self.open_for - (time.monotonic() - self.opened_at))
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls, failures = self._window_counts(time.monotonic())
+            return {
+                "state": self.state,
+                "window_calls": calls,
+                "window_failures": failures,
+                "retry_after": round(self.retry_after(), 3) if self.state == OPEN else 0,
+                "slow_call_ms": self.slow_call * 1000,
+            }
+
+
+db_breaker = CircuitBreaker(
+    window=settings.BREAKER_WINDOW,
+    min_calls=settings.BREAKER_MIN_CALLS,
+    failure_rate=settings.BREAKER_FAILURE_RATE,
+    slow_call=settings.BREAKER_SLOW_CALL_MS / 1000,
+    open_for=settings.BREAKER_OPEN_SECONDS,
+    half_open_calls=settings.BREAKER_HALF_OPEN_CALLS,
+)
+BREAKER_STATE.set(0)
+
+
+class BreakerListener(monitoring.CommandListener):
+    """Feeds every Mongo command outcome into db_breaker.
+
+    The driver calls it in the task that runs the command, so the route
+    deadline set by DatabaseRoute is visible here.
+    """
+
+    def started(self, event):
+        pass
+
+    def _record(self, event, ok: bool):
+        deadline = _route_deadline.get()
+        timed = deadline is not None and event.command_name not in _NOT_TIMED
+        db_breaker.record(event.duration_micros / 1e6, ok, timed, deadline or 0.0)
+
+    def succeeded(self, event):
+        self._record(event, True)
+
+    def failed(self, event):
+        self._record(event, not is_availability_failure(event.failure or {}))
+
+
+class DatabaseRoute(APIRoute):
+    """Route class for endpoints backed by Mongo.
+
+    Refuses with 503 while the breaker is open, and runs the handler under
+    the route's deadline: pymongo.timeout() turns the remaining budget into
+    maxTimeMS (and socket timeouts) for every operation inside, and the
+    handler itself is cancelled with 504 when the deadline passes. Response
+    bodies streamed after the handler returns are not bounded.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def guarded(request: Request):
+            if settings.BREAKER_ENABLED and not db_breaker.allow():
+                BREAKER_REJECTED.inc()
+                raise HTTPException(
+                    status_code=503,
+                    detail="Database unavailable, retry later",
+                    headers={"Retry-After": str(max(1, math.ceil(db_breaker.retry_after())))},
+                )
+            deadline = deadline_for(request.method, self.path)
+            if not deadline:
+                return await handler(request)
+            started = time.monotonic()
+            token = _route_deadline.set(deadline)
+            try:
+                with pymongo.timeout(deadline):
+                    return await asyncio.wait_for(handler(request), deadline)
+            except asyncio.TimeoutError:
+                pass
+            except PyMongoError as e:
+                # Handlers that do not wrap driver errors (e.g. load_user)
+                if not e.timeout:
+                    raise
+            except HTTPException as e:
+                # Handlers turn driver errors into 500; one raised because
+                # maxTimeMS ran out is still a missed deadline
+                if e.status_code != 500 or time.monotonic() - started < deadline:
+                    raise
+            finally:
+                _route_deadline.reset(token)
+            DEADLINE_EXCEEDED.labels(request.method, self.path).inc()
+            raise HTTPException(status_code=504, detail="Deadline exceeded")
+
+        return guarded
@@ -0,0 +1,127 @@
+# app/revocation.py
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from jose import jwt
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.database import mongodb
+from app.logging_config import logger
+from app.metrics import REVOCATION_SYNC_LATENCY
+
+# Revocations written by other workers just before a sync may carry a
+# slightly earlier revoked_at; re-reading a short window catches them
+_SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def _expires_at(payload: dict) -> datetime:
+    return datetime.utcfromtimestamp(payload["exp"])
+
+
+class RefreshTokenStore:
+    """Issued refresh tokens by jti; a token is valid while its document exists.
+
+    Refreshing consumes the document (single use), logout deletes it. The
+    TTL index on expires_at removes tokens nobody came back for.
+    """
+
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+
+    async def add(self, token: str):
+        # Just issued by us, no need to verify the signature again
+        payload = jwt.get_unverified_claims(token)
+        await mongodb.get_collection(self.collection_name).insert_one({
+            "_id": payload["jti"],
+            "sub": payload["sub"],
+            "expires_at": _expires_at(payload),
+            "created_at": datetime.utcnow(),
+        })
+
+    async def consume(self, jti: str) -> Optional[dict]:
+        """Atomically remove and return the token; None if unknown, used or revoked"""
+        return await mongodb.get_collection(self.collection_name).find_one_and_delete({"_id": jti})
+
+    async def delete(self, jti: str):
+        await mongodb.get_collection(self.collection_name).delete_one({"_id": jti})
+
+
+class RevocationList:
+    """Revoked access-token jtis, stored in Mongo and mirrored in memory.
+
+    is_revoked() only consults the in-process set, so checking a token that
+    was never revoked costs a set lookup and no round-trip. The set is
+    refreshed every `interval` seconds from documents revoked since the last
+    sync; revocations made in this worker apply immediately, those made in
+    other workers within one interval. Entries leave the set once the token
+    would have expired anyway, and the TTL index drops them from Mongo.
+    """
+
+    def __init__(self, collection_name: str, interval: float):
+        self.collection_name = collection_name
+        self.interval = interval
+        self._revoked = {}
+        self._synced_at = None
+        self.syncs = 0
+        self._task = None
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def is_revoked(self, jti: str) -> bool:
+        exp = self._revoked.get(jti)
+        return exp is not None and exp > time.time()
+
+    async def revoke(self, payload: dict):
+        jti = payload["jti"]
+        self._revoked[jti] = payload["exp"]
+        try:
+            await mongodb.get_collection(self.collection_name).insert_one({
+                "_id": jti,
+                "sub": payload["sub"],
+                "expires_at": _expires_at(payload),
+                "revoked_at": datetime.utcnow(),
+            })
+        except DuplicateKeyError:
+            pass
+
+    async def sync(self):
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        query = {"expires_at": {"$gt": now}}
+        if self._synced_at is not None:
+            query["revoked_at"] = {"$gte": self._synced_at - _SYNC_OVERLAP}
+        cursor = mongodb.get_collection(self.collection_name).find(query, {"expires_at": 1})
+        async for document in cursor:
+            self._revoked[document["_id"]] = (document["expires_at"] - datetime(1970, 1, 1)).total_seconds()
+        self._synced_at = now
+
+        cutoff = time.time()
+        for jti in [jti for jti, exp in self._revoked.items() if exp <= cutoff]:
+            del self._revoked[jti]
+        self.syncs += 1
+        REVOCATION_SYNC_LATENCY.observe(time.perf_counter() - started)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                # Keep serving from the last good set; the next sync catches up
+                logger.warning("revocation_sync_failed", extra={"fields": {"error": str(e)}})
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+refresh_tokens = RefreshTokenStore("refresh_tokens")
+revoked_tokens = RevocationList("revoked_tokens", interval=settings.REVOCATION_SYNC_INTERVAL)
@@ -1,13 +1,19 @@
 # app/routers/auth.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-import hashlib
-import secrets
 from datetime import datetime
-from app.database import mongodb, run_async
+from app.database import mongodb
+from app.auth import create_access_token, create_refresh_token, decode_token
+from app.deps import Principal, get_current_user, access_payload
+from app.passwords import password_hasher, PasswordPoolBusy
+from app.ratelimit import auth_admission
+from app.revocation import refresh_tokens, revoked_tokens
+from app.resilience import DatabaseRoute
+from app.utils import utc_now_ms
+from pymongo.errors import DuplicateKeyError
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=DatabaseRoute)
 
 class UserCreate(BaseModel):
     name: str
@@ -18,6 +24,12 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
 class UserResponse(BaseModel):
     id: str
     name: str
@@ -25,86 +37,120 @@ class UserResponse(BaseModel):
     role: str
     registration_date: datetime
 
-def hash_password(password: str) -> str:
-    """Simple password hashing using SHA-256 with salt"""
-    salt = secrets.token_hex(16)
-    password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-    return f"{salt}${password_hash}"
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password against hash"""
-    try:
-        salt, stored_hash = hashed_password.split('$')
-        computed_hash = hashlib.sha256((plain_password + salt).encode()).hexdigest()
-        return secrets.compare_digest(computed_hash, stored_hash)
-    except Exception:
-        return False
+def busy_response():
+    # Shed load before the request queues behind other KDF work
+    return HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
 
 @router.post("/register", response_model=UserResponse)
-async def register(user: UserCreate):
-    def sync_register():
-        collection = mongodb.get_collection("users")
-        
-        # Check if user already exists
-        existing_user = collection.find_one({"email": user.email})
-        if existing_user:
-            raise ValueError("User with this email already exists")
-
-        # Hash password
-        hashed_password = hash_password(user.password)
-
-        # Create new user
-        new_user = {
-            "name": user.name,
-            "email": user.email,
-            "password": hashed_password,
-            "role": "user",
-            "registration_date": datetime.utcnow()
-        }
-
-        # Insert user
-        result = collection.insert_one(new_user)
-        
-        # Get the created user
-        created_user = collection.find_one({"_id": result.inserted_id})
-        return UserResponse(
-            id=str(created_user["_id"]),
-            name=created_user["name"],
-            email=created_user["email"],
-            role=created_user["role"],
-            registration_date=created_user["registration_date"]
-        )
-    
-    try:
-        created_user = await run_async(sync_register)
-        return created_user
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Internal server error")
+async def register(user: UserCreate, request: Request):
+    collection = mongodb.get_collection("users")
+
+    # Rate and concurrency limits reject before any DB or hashing work
+    async with auth_admission("register", request, user.email):
+        try:
+            # Hash password
+            hashed_password = await password_hasher.hash(user.password)
+
+            # Create new user
+            new_user = {
+                "name": user.name,
+                "email": user.email,
+                "password": hashed_password,
+                "role": "user",
+                "registration_date": utc_now_ms()
+            }
+
+            # Insert user, the unique email index rejects duplicates
+            try:
+                result = await collection.insert_one(new_user)
+            except DuplicateKeyError:
+                raise ValueError("User with this email already exists")
+
+            # The inserted document is already known, no need to read it back
+            return UserResponse(
+                id=str(result.inserted_id),
+                name=new_user["name"],
+                email=new_user["email"],
+                role=new_user["role"],
+                registration_date=new_user["registration_date"]
+            )
+        except PasswordPoolBusy:
+            raise busy_response()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.post("/login")
-async def login(user_data: UserLogin):
-    def sync_login():
-        collection = mongodb.get_collection("users")
-        
-        # Find user by email
-        user = collection.find_one({"email": user_data.email})
-        
-        if not user or not verify_password(user_data.password, user["password"]):
-            raise ValueError("Invalid credentials")
-        
-        return {
-            "message": "Login successful",
-            "user_id": str(user["_id"]),
-            "email": user["email"],
-            "name": user["name"]
-        }
-    
-    try:
-        result = await run_async(sync_login)
-        return result
-    except ValueError as e:
-        raise HTTPException(status_code=401, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+async def login(user_data: UserLogin, request: Request):
+    collection = mongodb.get_collection("users")
+
+    # Rate and concurrency limits reject before any DB or hashing work
+    async with auth_admission("login", request, user_data.email):
+        try:
+            # Find user by email
+            user = await collection.find_one({"email": user_data.email})
+
+            if not user:
+                # Unknown email takes as long as a wrong password
+                await password_hasher.verify_dummy(user_data.password)
+                raise ValueError("Invalid credentials")
+
+            valid, new_hash = await password_hasher.verify(user_data.password, user["password"])
+            if not valid:
+                raise ValueError("Invalid credentials")
+
+            # Legacy SHA-256 or outdated cost factor: store the fresh hash
+            if new_hash:
+                await collection.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+
+            refresh_token = create_refresh_token(user["_id"])
+            await refresh_tokens.add(refresh_token)
+
+            return {
+                "message": "Login successful",
+                "user_id": str(user["_id"]),
+                "email": user["email"],
+                "name": user["name"],
+                "access_token": create_access_token(user["_id"]),
+                "refresh_token": refresh_token,
+                "token_type": "bearer"
+            }
+        except PasswordPoolBusy:
+            raise busy_response()
+        except ValueError as e:
+            raise HTTPException(status_code=401, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.post("/refresh")
+async def refresh(body: RefreshRequest):
+    payload = decode_token(body.refresh_token)
+    if not payload or payload.get("type") != "refresh" or "jti" not in payload:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    # Refresh tokens are single use: the stored one is consumed and replaced
+    if not await refresh_tokens.consume(payload["jti"]):
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+    refresh_token = create_refresh_token(payload["sub"])
+    await refresh_tokens.add(refresh_token)
+    return {
+        "access_token": create_access_token(payload["sub"]),
+        "refresh_token": refresh_token,
+        "token_type": "bearer"
+    }
+
+@router.post("/logout", status_code=204)
+async def logout(body: Optional[LogoutRequest] = None, payload: dict = Depends(access_payload)):
+    """Revoke the presented access token and, if given, its refresh token"""
+    await revoked_tokens.revoke(payload)
+    if body and body.refresh_token:
+        refresh_payload = decode_token(body.refresh_token)
+        if refresh_payload and refresh_payload.get("type") == "refresh" and "jti" in refresh_payload:
+            # Only the owner of the session may end it
+            if refresh_payload["sub"] == payload["sub"]:
+                await refresh_tokens.delete(refresh_payload["jti"])
+
+@router.get("/me", response_model=Principal)
+async def me(user: Principal = Depends(get_current_user)):
+    return user
\ No newline at end of file
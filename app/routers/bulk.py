@@ -0,0 +1,246 @@
+# app/routers/bulk.py
+from fastapi import APIRouter, HTTPException, Request
+from typing import List
+from pydantic import BaseModel, ValidationError
+from app.config import settings
+from app.database import mongodb
+from app.cache import user_cache, principal_cache
+from app.routers.users import UserCreate, UserUpdate
+from app.resilience import DatabaseRoute
+from app.utils import utc_now_ms
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import json
+import time
+
+# Same prefix as the users router; included before it in main.py so that
+# /users/bulk is not captured by /users/{user_id}
+router = APIRouter(prefix="/users", tags=["users"], route_class=DatabaseRoute)
+
+DUPLICATE_EMAIL = "User with this email already exists"
+
+class UserBulkUpdate(UserUpdate):
+    id: str
+
+class UserBulkDelete(BaseModel):
+    ids: List[str]
+
+async def iter_bulk_items(request: Request):
+    """Yield (index, item) from a JSON array or an NDJSON stream.
+
+    NDJSON is parsed as it arrives, so a large import never sits in memory
+    as a whole. Lines that are not valid JSON are yielded as ValueError.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array")
+        for index, item in enumerate(items):
+            yield index, item
+        return
+
+    index = 0
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError as e:
+                yield index, ValueError(f"Invalid JSON: {e}")
+            index += 1
+    if buffer.strip():
+        try:
+            yield index, json.loads(buffer)
+        except ValueError as e:
+            yield index, ValueError(f"Invalid JSON: {e}")
+
+def write_error_message(error: dict) -> str:
+    if error.get("code") == 11000:
+        return DUPLICATE_EMAIL
+    return error.get("errmsg", "Write error")
+
+def bulk_summary(results: list, started: float, **counts) -> dict:
+    elapsed = time.perf_counter() - started
+    succeeded = sum(1 for r in results if r["status"] != "error")
+    return {
+        "processed": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        **counts,
+        "elapsed_s": round(elapsed, 4),
+        "docs_per_second": round(succeeded / elapsed, 1) if elapsed else None,
+        "results": results,
+    }
+
+async def insert_batch(collection, batch: list) -> list:
+    """insert_many one batch of (index, document); per-item results"""
+    failed = {}
+    try:
+        await collection.insert_many([doc for _, doc in batch], ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"]: err for err in e.details.get("writeErrors", [])}
+
+    results = []
+    for position, (index, doc) in enumerate(batch):
+        if position in failed:
+            results.append({"index": index, "status": "error", "error": write_error_message(failed[position])})
+        else:
+            results.append({"index": index, "status": "created", "id": str(doc["_id"])})
+    return results
+
+async def existing_ids(collection, ids: list) -> set:
+    """Which of these _ids exist, in one $in query"""
+    return {doc["_id"] async for doc in collection.find({"_id": {"$in": ids}}, {"_id": 1})}
+
+# BULK CREATE - Массовое создание пользователей
+@router.post("/bulk")
+async def bulk_create_users(request: Request):
+    """Accepts a JSON array or application/x-ndjson of UserCreate objects"""
+    collection = mongodb.get_collection("users")
+    started = time.perf_counter()
+    results = []
+    batch = []
+    rejected_from = None
+
+    async for index, item in iter_bulk_items(request):
+        if len(results) + len(batch) >= settings.USERS_BULK_MAX_ITEMS:
+            # Earlier batches are already written: stop reading and report
+            # them rather than failing the whole request
+            rejected_from = index
+            results.append({
+                "index": index,
+                "status": "error",
+                "error": f"At most {settings.USERS_BULK_MAX_ITEMS} items per request; this and later items were not processed",
+            })
+            break
+        if isinstance(item, Exception):
+            results.append({"index": index, "status": "error", "error": str(item)})
+            continue
+        try:
+            user = UserCreate(**item)
+        except (ValidationError, TypeError) as e:
+            results.append({"index": index, "status": "error", "error": str(e)})
+            continue
+
+        user_data = user.dict()
+        user_data["registration_date"] = utc_now_ms()
+        batch.append((index, user_data))
+        if len(batch) >= settings.USERS_BULK_BATCH_SIZE:
+            results.extend(await insert_batch(collection, batch))
+            batch = []
+
+    if batch:
+        results.extend(await insert_batch(collection, batch))
+
+    results.sort(key=lambda r: r["index"])
+    return bulk_summary(results, started, truncated=rejected_from is not None, rejected_from_index=rejected_from)
+
+# BULK UPDATE - Массовое обновление пользователей
+@router.put("/bulk")
+async def bulk_update_users(updates: List[UserBulkUpdate]):
+    if len(updates) > settings.USERS_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.USERS_BULK_MAX_ITEMS} items per request")
+
+    collection = mongodb.get_collection("users")
+    started = time.perf_counter()
+    results = []
+    operations = []
+    updated_ids = []
+    matched = modified = 0
+
+    async def flush():
+        nonlocal matched, modified
+        # Ids that match nothing are reported as such instead of "updated"
+        found = await existing_ids(collection, [user_id for _, user_id, _ in operations])
+        batch = []
+        for index, user_id, op in operations:
+            if user_id in found:
+                batch.append((index, user_id, op))
+            else:
+                results.append({"index": index, "status": "error", "error": "User not found"})
+        operations.clear()
+        if not batch:
+            return
+
+        failed = {}
+        try:
+            result = await collection.bulk_write([op for _, _, op in batch], ordered=False)
+            matched += result.matched_count
+            modified += result.modified_count
+        except BulkWriteError as e:
+            failed = {err["index"]: err for err in e.details.get("writeErrors", [])}
+            matched += e.details.get("nMatched", 0)
+            modified += e.details.get("nModified", 0)
+        for position, (index, user_id, _) in enumerate(batch):
+            if position in failed:
+                results.append({"index": index, "status": "error", "error": write_error_message(failed[position])})
+            else:
+                results.append({"index": index, "status": "updated"})
+                updated_ids.append(str(user_id))
+
+    for index, update in enumerate(updates):
+        if not ObjectId.is_valid(update.id):
+            results.append({"index": index, "status": "error", "error": "Invalid user id"})
+            continue
+        update_data = {k: v for k, v in update.dict(exclude={"id"}).items() if v is not None}
+        if not update_data:
+            results.append({"index": index, "status": "error", "error": "Nothing to update"})
+            continue
+        user_id = ObjectId(update.id)
+        operations.append((index, user_id, UpdateOne({"_id": user_id}, {"$set": update_data, "$inc": {"version": 1}})))
+        if len(operations) >= settings.USERS_BULK_BATCH_SIZE:
+            await flush()
+
+    if operations:
+        await flush()
+    await user_cache.delete(*updated_ids)
+    await principal_cache.delete(*updated_ids)
+
+    results.sort(key=lambda r: r["index"])
+    return bulk_summary(results, started, matched=matched, modified=modified)
+
+# BULK DELETE - Массовое удаление пользователей
+@router.delete("/bulk")
+async def bulk_delete_users(body: UserBulkDelete):
+    if len(body.ids) > settings.USERS_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.USERS_BULK_MAX_ITEMS} items per request")
+
+    collection = mongodb.get_collection("users")
+    started = time.perf_counter()
+    results = []
+    valid = []
+    deleted = 0
+
+    for index, user_id in enumerate(body.ids):
+        if not ObjectId.is_valid(user_id):
+            results.append({"index": index, "status": "error", "error": "Invalid user id"})
+            continue
+        valid.append((index, ObjectId(user_id)))
+
+    for start in range(0, len(valid), settings.USERS_BULK_BATCH_SIZE):
+        chunk = valid[start:start + settings.USERS_BULK_BATCH_SIZE]
+        found = await existing_ids(collection, [user_id for _, user_id in chunk])
+        if found:
+            result = await collection.delete_many({"_id": {"$in": list(found)}})
+            deleted += result.deleted_count
+            ids = [str(user_id) for user_id in found]
+            await user_cache.delete(*ids)
+            # Deleted users must stop authenticating now, not after PRINCIPAL_CACHE_TTL
+            await principal_cache.delete(*ids)
+        for index, user_id in chunk:
+            if user_id in found:
+                results.append({"index": index, "status": "deleted"})
+            else:
+                results.append({"index": index, "status": "error", "error": "User not found"})
+
+    results.sort(key=lambda r: r["index"])
+    return bulk_summary(results, started, deleted=deleted)
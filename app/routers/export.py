@@ -0,0 +1,104 @@
+# app/routers/export.py
+import csv
+import io
+import time
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+from app.config import settings
+from app.database import mongodb
+from app.cache import LRUCache, SingleFlight
+from app.utils import USER_FIELDS, USER_PROJECTION
+from app.serialization import user_to_dict, user_to_ndjson
+from app.resilience import DatabaseRoute
+from bson import ObjectId
+
+# Same prefix as the users router; included before it in main.py so that
+# /users/export and /users/count are not captured by /users/{user_id}
+router = APIRouter(prefix="/users", tags=["users"], route_class=DatabaseRoute)
+
+CSV_COLUMNS = ("id",) + USER_FIELDS
+
+count_cache = LRUCache(maxsize=1, ttl=settings.USERS_COUNT_CACHE_TTL)
+count_flight = SingleFlight()
+
+
+def csv_row(values) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode()
+
+
+def user_to_csv(user: dict) -> bytes:
+    data = user_to_dict(user)
+    return csv_row(data.get(column, "") for column in CSV_COLUMNS)
+
+
+@router.get("/export")
+async def export_users(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    batch_size: int = Query(settings.USERS_EXPORT_BATCH_SIZE, ge=1, le=settings.USERS_EXPORT_MAX_BATCH_SIZE),
+    after: Optional[str] = None,
+):
+    """Full dump of users in _id order, streamed from a batched cursor.
+
+    Memory stays at one cursor batch regardless of collection size. An
+    interrupted export is resumed by passing the id of the last row
+    received as `after`.
+    """
+    query = {}
+    if after is not None:
+        if not ObjectId.is_valid(after):
+            raise HTTPException(status_code=400, detail="Invalid after id")
+        query = {"_id": {"$gt": ObjectId(after)}}
+
+    collection = mongodb.get_read_collection("users")
+    cursor = collection.find(query, USER_PROJECTION).sort("_id", 1).batch_size(batch_size)
+
+    if format == "csv":
+        async def stream():
+            yield csv_row(CSV_COLUMNS)
+            async for user in cursor:
+                yield user_to_csv(user)
+
+        media_type = "text/csv"
+    else:
+        async def stream():
+            async for user in cursor:
+                yield user_to_ndjson(user)
+
+        media_type = "application/x-ndjson"
+
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
+
+
+async def exact_count() -> dict:
+    cached = await count_cache.get("users")
+    if cached is not None:
+        return cached
+
+    async def count():
+        collection = mongodb.get_read_collection("users")
+        result = {"count": await collection.count_documents({}), "counted_at": time.time()}
+        await count_cache.set("users", result)
+        return result
+
+    # One full count at a time, however many dashboards ask at once
+    return await count_flight.do("users", count)
+
+
+@router.get("/count")
+async def count_users(exact: bool = False):
+    """Collection size from metadata; exact=true runs a full count, cached for USERS_COUNT_CACHE_TTL"""
+    try:
+        if exact:
+            result = await exact_count()
+            return {"count": result["count"], "exact": True, "age": round(time.time() - result["counted_at"], 3)}
+        count = await mongodb.get_read_collection("users").estimated_document_count()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Internal server error")
+    return {"count": count, "exact": False}
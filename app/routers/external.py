@@ -1,29 +1,85 @@
 #routers/external.py
 from fastapi import APIRouter, HTTPException
 import httpx, asyncio
+import time
 from app.config import settings
-import redis.asyncio as aioredis
+from app.cache import get_redis, LRUCache, SingleFlight
 import json
 
 router = APIRouter(prefix="/external", tags=["external"])
-redis = None
 
-@router.on_event("startup")
-async def startup_redis():
-    global redis
-    redis = await aioredis.from_url(settings.REDIS_URL)
+# Pooled client shared by every request, opened/closed with the app
+http_client = None
+
+# Small in-process L1 in front of Redis; hot keys skip the Redis round-trip
+weather_l1 = LRUCache(maxsize=settings.WEATHER_L1_MAXSIZE, ttl=settings.WEATHER_L1_TTL)
+weather_flight = SingleFlight()
+_background = set()
+
+async def start_http_client():
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            timeout=settings.EXTERNAL_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.EXTERNAL_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.EXTERNAL_HTTP_MAX_KEEPALIVE,
+            ),
+        )
+
+async def close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+async def fetch_weather(city: str, key: str) -> dict:
+    """Upstream call; stores {data, fetched_at} in Redis and L1"""
+    if http_client is None:
+        await start_http_client()
+    resp = await http_client.get(settings.WEATHER_API_URL, params={"q": city, "appid": settings.WEATHER_API_KEY})
+    if resp.status_code != 200:
+        raise HTTPException(status_code=502, detail="External API error")
+    entry = {"data": resp.json(), "fetched_at": time.time()}
+    # Kept past the fresh window so it can still be served while revalidating
+    await get_redis().set(key, json.dumps(entry), ex=settings.WEATHER_FRESH_TTL + settings.WEATHER_STALE_TTL)
+    await weather_l1.set(key, entry)
+    return entry
+
+def revalidate(city: str, key: str):
+    """Refresh a stale entry in the background, at most one refresh per key"""
+    if weather_flight.in_flight(key):
+        return
+
+    async def refresh():
+        try:
+            await weather_flight.do(key, lambda: fetch_weather(city, key))
+        except Exception:
+            pass  # the stale value stays until the next attempt
+
+    task = asyncio.create_task(refresh())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
 
 @router.get("/weather")
 async def get_weather(city: str):
     key = f"weather:{city.lower()}"
-    cached = await redis.get(key)
-    if cached:
-        return json.loads(cached)
-    # пример внешнего вызова (псевдо)
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        resp = await client.get(f"https://api.openweathermap.org/data/2.5/weather?q={city}&appid=YOUR_KEY")
-        if resp.status_code != 200:
-            raise HTTPException(status_code=502, detail="External API error")
-        data = resp.json()
-        await redis.set(key, json.dumps(data), ex=300)
-        return data
+
+    entry = await weather_l1.get(key)
+    if entry is None:
+        cached = await get_redis().get(key)
+        if cached:
+            entry = json.loads(cached)
+            await weather_l1.set(key, entry)
+
+    if entry is not None:
+        age = time.time() - entry["fetched_at"]
+        if age < settings.WEATHER_FRESH_TTL:
+            return entry["data"]
+        if age < settings.WEATHER_FRESH_TTL + settings.WEATHER_STALE_TTL:
+            revalidate(city, key)
+            return entry["data"]
+
+    # Miss: concurrent requests for the same city share one upstream call
+    entry = await weather_flight.do(key, lambda: fetch_weather(city, key))
+    return entry["data"]
@@ -1,12 +1,28 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from typing import List
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional
+from typing import Literal, Optional
 from datetime import datetime
-from app.database import mongodb, run_async
+from app.config import settings
+from app.database import mongodb
+from app.cache import user_cache, principal_cache
+from app.write_behind import user_write_behind
+from app.loader import load_user
+from app.utils import (
+    encode_cursor, decode_cursor, build_projection, USER_PROJECTION,
+    parse_sort, sort_spec, keyset_filter, prefix_regex, utc_now_ms,
+)
+from app.serialization import (
+    FastJSONResponse, user_to_dict, user_to_ndjson,
+    user_cache_entry, user_etag, list_etag, not_modified,
+)
+from app.resilience import DatabaseRoute
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=DatabaseRoute)
 
 class UserCreate(BaseModel):
     name: str = Field(..., min_length=2, max_length=50)
@@ -28,156 +44,251 @@ class UserResponse(BaseModel):
 # CREATE - Создать пользователя
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(user: UserCreate):
-    def sync_create():
-        collection = mongodb.get_collection("users")
-        
-        # Check if email already exists
-        existing_user = collection.find_one({"email": user.email})
-        if existing_user:
-            raise ValueError("User with this email already exists")
-        
+    collection = mongodb.get_collection("users")
+
+    try:
         # Prepare user data
         user_data = user.dict()
-        user_data["registration_date"] = datetime.utcnow()
-        
-        # Insert user
-        result = collection.insert_one(user_data)
-        
-        # Get the created user
-        created_user = collection.find_one({"_id": result.inserted_id})
-        return UserResponse(
-            id=str(created_user["_id"]),
-            name=created_user["name"],
-            surname=created_user["surname"],
-            email=created_user["email"],
-            registration_date=created_user["registration_date"]
+        user_data["registration_date"] = utc_now_ms()
+        user_data["version"] = 1
+
+        # Insert user, the unique email index rejects duplicates
+        try:
+            result = await collection.insert_one(user_data)
+        except DuplicateKeyError:
+            raise ValueError("User with this email already exists")
+
+        # The inserted document is already known, no need to read it back;
+        # insert_one has set user_data["_id"]
+        return FastJSONResponse(
+            user_to_dict(user_data),
+            status_code=status.HTTP_201_CREATED,
+            headers={"ETag": user_etag(str(user_data["_id"]), 1)}
         )
-    
-    try:
-        created_user = await run_async(sync_create)
-        return created_user
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
+def parse_fields(fields: Optional[str]) -> dict:
+    try:
+        return build_projection(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def build_list_query(
+    name: Optional[str],
+    surname: Optional[str],
+    email_prefix: Optional[str],
+    registered_from: Optional[datetime],
+    registered_to: Optional[datetime],
+    q: Optional[str],
+    search: str,
+) -> dict:
+    clauses = []
+    if name is not None:
+        clauses.append({"name": name})
+    if surname is not None:
+        clauses.append({"surname": surname})
+    if email_prefix:
+        clauses.append({"email": prefix_regex(email_prefix)})
+    if registered_from or registered_to:
+        date_range = {}
+        if registered_from:
+            date_range["$gte"] = registered_from
+        if registered_to:
+            date_range["$lt"] = registered_to
+        clauses.append({"registration_date": date_range})
+    if q:
+        if search == "text":
+            clauses.append({"$text": {"$search": q}})
+        else:
+            clauses.append({"$or": [{"name": prefix_regex(q)}, {"surname": prefix_regex(q)}]})
+    if not clauses:
+        return {}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
 # READ - Получить всех пользователей
 @router.get("/", response_model=List[UserResponse])
-async def get_all_users():
-    def sync_get_all():
-        collection = mongodb.get_collection("users")
-        users = list(collection.find())
-        result = []
-        for user in users:
-            result.append(UserResponse(
-                id=str(user["_id"]),
-                name=user["name"],
-                surname=user["surname"],
-                email=user["email"],
-                registration_date=user["registration_date"]
-            ))
-        return result
-    
+async def get_all_users(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=settings.USERS_MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+    fields: Optional[str] = None,
+    name: Optional[str] = None,
+    surname: Optional[str] = None,
+    email_prefix: Optional[str] = None,
+    registered_from: Optional[datetime] = None,
+    registered_to: Optional[datetime] = None,
+    sort: Optional[str] = None,
+    q: Optional[str] = None,
+    search: Literal["prefix", "text"] = "prefix",
+):
+    """Filtered, sorted listing with keyset pagination.
+
+    The cursor for the next page is returned in the X-Next-Cursor header and
+    should be passed back as `after` with the same filters and sort. With
+    format=ndjson documents are streamed as the cursor yields them; in that
+    mode `limit` is optional. `fields` is a comma separated subset of the user
+    fields to return. `sort` is a field name, prefixed with "-" for
+    descending. `q` matches the start of name or surname (search=prefix) or
+    words in either (search=text).
+    """
+    collection = mongodb.get_read_collection("users")
+    projection = parse_fields(fields)
     try:
-        users = await run_async(sync_get_all)
-        return users
+        sort_field, direction = parse_sort(sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    query = build_list_query(name, surname, email_prefix, registered_from, registered_to, q, search)
+    if after is not None:
+        cursor_position = decode_cursor(after)
+        if cursor_position is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        try:
+            after_filter = keyset_filter(cursor_position, sort_field, direction)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = {"$and": [query, after_filter]} if query else after_filter
+
+    # The sort key must be fetched to build the next cursor
+    fetch_projection = projection
+    if sort_field != "_id" and sort_field not in projection:
+        fetch_projection = {**projection, sort_field: 1}
+
+    if format == "ndjson":
+        cursor = collection.find(query, projection).sort(sort_spec(sort_field, direction)).batch_size(settings.USERS_STREAM_BATCH_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+
+        async def stream():
+            async for user in cursor:
+                yield user_to_ndjson(user)
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    page_size = limit or settings.USERS_PAGE_SIZE
+    try:
+        # One extra document tells us whether there is a next page
+        users = await collection.find(query, fetch_projection).sort(sort_spec(sort_field, direction)).limit(page_size + 1).to_list(length=page_size + 1)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    headers = {}
+    if len(users) > page_size:
+        users = users[:page_size]
+        last = users[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last["_id"], sort_field, last.get(sort_field))
+
+    # Same documents at the same versions: answer 304 before serializing anything
+    headers["ETag"] = list_etag(
+        ((str(user["_id"]), user.get("version", 0)) for user in users),
+        extra=str(request.url.query) + headers.get("X-Next-Cursor", ""),
+    )
+    cached = not_modified(request, headers["ETag"])
+    if cached is not None:
+        return cached
+
+    # Partial documents (fields=) go through the same path
+    page = [user_to_dict(user) for user in users]
+    if fetch_projection is not projection:
+        page = [{k: v for k, v in user.items() if k != sort_field} for user in page]
+    return FastJSONResponse(page, headers=headers)
+
 # READ - Получить пользователя по ID
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: str):
-    def sync_get_by_id():
-        collection = mongodb.get_collection("users")
-        if not ObjectId.is_valid(user_id):
-            return None
-            
-        user = collection.find_one({"_id": ObjectId(user_id)})
-        if user:
-            return UserResponse(
-                id=str(user["_id"]),
-                name=user["name"],
-                surname=user["surname"],
-                email=user["email"],
-                registration_date=user["registration_date"]
-            )
-        return None
-    
-    user = await run_async(sync_get_by_id)
-    if not user:
+async def get_user(user_id: str, request: Request, fields: Optional[str] = None):
+    projection = parse_fields(fields)
+    if not ObjectId.is_valid(user_id):
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+
+    # The cache always holds the full public document, fields= is applied on top
+    user = await user_cache.get(str(ObjectId(user_id)))
+    if user is None:
+        # Batched with other concurrent lookups into one $in query
+        found = await load_user(ObjectId(user_id))
+        if not found:
+            raise HTTPException(status_code=404, detail="User not found")
+        user = user_cache_entry(found)
+        # add, not set: a write that raced this read has left a tombstone
+        await user_cache.add(str(ObjectId(user_id)), user)
+
+    etag = user_etag(user["id"], user.get("_version", 0))
+    if fields:
+        etag = etag[:-1] + ";" + ",".join(sorted(projection)) + '"'
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    if fields:
+        user = {k: v for k, v in user.items() if k == "id" or k in projection}
+    else:
+        user = {k: v for k, v in user.items() if k != "_version"}
+    return FastJSONResponse(user, headers={"ETag": etag})
 
 # UPDATE - Обновить пользователя
 @router.put("/{user_id}", response_model=UserResponse)
-async def update_user(user_id: str, user_update: UserUpdate):
-    def sync_update():
-        collection = mongodb.get_collection("users")
-        if not ObjectId.is_valid(user_id):
-            return None
+async def update_user(user_id: str, user_update: UserUpdate, defer: bool = False):
+    """defer=true queues the update on the write-behind queue and returns 202.
+
+    Only for name/surname: email changes need the unique index check, which a
+    deferred write cannot report back.
+    """
+    collection = mongodb.get_collection("users")
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if defer and settings.USERS_WRITE_BEHIND_ENABLED:
+        if user_update.email is not None:
+            raise HTTPException(status_code=400, detail="Email cannot be updated with defer=true")
+        update_data = {k: v for k, v in user_update.dict().items() if v is not None}
+        if update_data:
+            user_write_behind.enqueue(ObjectId(user_id), update_data)
+        return FastJSONResponse({"id": str(ObjectId(user_id)), "status": "queued"}, status_code=status.HTTP_202_ACCEPTED)
 
+    try:
         # Remove None values from update
         update_data = {k: v for k, v in user_update.dict().items() if v is not None}
-        
-        if not update_data:
-            user = collection.find_one({"_id": ObjectId(user_id)})
-            if user:
-                return UserResponse(
-                    id=str(user["_id"]),
-                    name=user["name"],
-                    surname=user["surname"],
-                    email=user["email"],
-                    registration_date=user["registration_date"]
+
+        if update_data:
+            # Update and read back in one round-trip; the unique email
+            # index rejects an email taken by another user
+            try:
+                user = await collection.find_one_and_update(
+                    {"_id": ObjectId(user_id)},
+                    {"$set": update_data, "$inc": {"version": 1}},
+                    projection=USER_PROJECTION,
+                    return_document=ReturnDocument.AFTER
                 )
-            return None
-        
-        # Check if email is being updated and if it already exists
-        if user_update.email:
-            existing_user = collection.find_one({
-                "email": user_update.email,
-                "_id": {"$ne": ObjectId(user_id)}
-            })
-            if existing_user:
+            except DuplicateKeyError:
                 raise ValueError("User with this email already exists")
-
-        collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": update_data}
-        )
-        
-        user = collection.find_one({"_id": ObjectId(user_id)})
-        if user:
-            return UserResponse(
-                id=str(user["_id"]),
-                name=user["name"],
-                surname=user["surname"],
-                email=user["email"],
-                registration_date=user["registration_date"]
-            )
-        return None
-    
-    try:
-        updated_user = await run_async(sync_update)
-        if not updated_user:
-            raise HTTPException(status_code=404, detail="User not found")
-        return updated_user
+        else:
+            user = await collection.find_one({"_id": ObjectId(user_id)}, USER_PROJECTION)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    await user_cache.delete(str(ObjectId(user_id)))
+    await principal_cache.delete(str(ObjectId(user_id)))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return FastJSONResponse(user_to_dict(user), headers={"ETag": user_etag(str(user["_id"]), user.get("version", 0))})
+
 # DELETE - Удалить пользователя
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(user_id: str):
-    def sync_delete():
-        collection = mongodb.get_collection("users")
-        if not ObjectId.is_valid(user_id):
-            return False
-            
-        result = collection.delete_one({"_id": ObjectId(user_id)})
-        return result.deleted_count > 0
-    
-    success = await run_async(sync_delete)
-    if not success:
+    collection = mongodb.get_collection("users")
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    result = await collection.delete_one({"_id": ObjectId(user_id)})
+    await user_cache.delete(str(ObjectId(user_id)))
+    await principal_cache.delete(str(ObjectId(user_id)))
+    if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     return None
@@ -1,22 +1,28 @@
 #routers/webhooks.py
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, status
 import hmac, hashlib
 from app.config import settings
-from app.database import AsyncSessionLocal
+from app.webhook_queue import ingest
+from app.resilience import DatabaseRoute
 import json
 
-router = APIRouter(prefix="/webhooks", tags=["webhooks"])
-SECRET = "webhook-secret"
+router = APIRouter(prefix="/webhooks", tags=["webhooks"], route_class=DatabaseRoute)
 
-@router.post("/provider")
+@router.post("/provider", status_code=status.HTTP_202_ACCEPTED)
 async def webhook_provider(request: Request):
     body = await request.body()
     signature = request.headers.get("X-Signature", "")
-    expected = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    expected = hmac.new(settings.WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
     if not hmac.compare_digest(signature, expected):
         raise HTTPException(status_code=401, detail="Invalid signature")
-    payload = json.loads(body)
-    event_id = payload.get("id")
-    # реализовать идемпотентность: проверить в БД, обработан ли event_id
-    # сохранить событие
-    return {"status": "ok"}
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    event_id = payload.get("id") if isinstance(payload, dict) else None
+    if not event_id:
+        raise HTTPException(status_code=400, detail="Missing event id")
+
+    # Persist and acknowledge; processing happens on the background workers
+    result = await ingest(str(event_id), payload)
+    return {"status": result}
@@ -0,0 +1,93 @@
+# app/serialization.py
+"""Mongo documents straight to JSON bytes, without a Pydantic round-trip.
+
+Handlers on hot paths return FastJSONResponse directly, so FastAPI skips
+response_model validation and jsonable_encoder; response_model is kept on
+the routes for the OpenAPI schema only.
+"""
+from datetime import datetime
+import hashlib
+from typing import Iterable, Optional, Tuple
+import orjson
+from bson import ObjectId
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from app.utils import USER_FIELDS
+
+# The one place that decides how BSON-only types look in JSON
+JSON_ENCODERS = {
+    ObjectId: str,
+    datetime: lambda value: value.isoformat(),
+}
+
+
+def _default(value):
+    encoder = JSON_ENCODERS.get(type(value))
+    if encoder is None:
+        raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+    return encoder(value)
+
+
+def dumps(content) -> bytes:
+    # Datetimes go through JSON_ENCODERS so output matches isoformat() exactly
+    return orjson.dumps(content, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def user_to_dict(user: dict) -> dict:
+    """JSON-ready dict with only the fields present in a projected document"""
+    result = {"id": str(user["_id"])}
+    for field in USER_FIELDS:
+        if field in user:
+            value = user[field]
+            result[field] = JSON_ENCODERS[datetime](value) if isinstance(value, datetime) else value
+    return result
+
+
+def user_to_ndjson(user: dict) -> bytes:
+    return dumps(user_to_dict(user)) + b"\n"
+
+
+def user_cache_entry(user: dict) -> dict:
+    """user_to_dict plus the document version under "_version" (stripped before output)"""
+    entry = user_to_dict(user)
+    entry["_version"] = user.get("version", 0)
+    return entry
+
+
+# ETags are weak: the same tag covers the identity and the gzip/brotli
+# encodings of a response, which a strong validator must not
+def user_etag(user_id: str, version: int) -> str:
+    return f'W/"{user_id}.{version}"'
+
+
+def list_etag(pairs: Iterable[Tuple[str, int]], extra: str = "") -> str:
+    """ETag for a page from its (id, version) pairs, no body serialization needed"""
+    digest = hashlib.blake2b(digest_size=16)
+    for user_id, version in pairs:
+        digest.update(f"{user_id}.{version};".encode())
+    digest.update(extra.encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 response when If-None-Match already has this ETag, else None.
+
+    Uses weak comparison (RFC 9110 13.1.2), so W/ prefixes added or kept by
+    intermediaries do not prevent a match.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    candidates = [tag.strip() for tag in header.split(",")]
+    if "*" in candidates or _opaque_tag(etag) in {_opaque_tag(tag) for tag in candidates}:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
@@ -0,0 +1,104 @@
+# app/serve.py
+"""Multi-process entry point.
+
+    WEB_CONCURRENCY=4 python -m app.serve
+
+Uses gunicorn with uvicorn workers when gunicorn is installed (pre-fork,
+worker restarts), otherwise uvicorn's own process manager. Either way every
+worker runs the app lifespan itself, so Mongo clients, HTTP clients and
+thread pools are created after the worker process exists and are never
+shared across a fork. Mongo pool size per worker defaults to
+MONGODB_TOTAL_POOL_SIZE / WEB_CONCURRENCY.
+
+Index reconciliation runs once here, before any worker starts, instead of
+concurrently in every worker. With more than one worker Prometheus metrics
+are kept per process in PROMETHEUS_MULTIPROC_DIR (a fresh temporary
+directory unless set) and aggregated by /metrics.
+"""
+import asyncio
+import glob
+import os
+import tempfile
+import uvicorn
+from app.config import settings
+
+
+async def reconcile_indexes():
+    # Own short-lived client in the master; workers build theirs after fork
+    from app.database import mongodb
+    from app.indexes import ensure_indexes
+    mongodb.connect()
+    try:
+        await ensure_indexes(mongodb.database)
+    finally:
+        await mongodb.close()
+
+
+def setup_multiprocess_metrics():
+    # Must be in the environment before prometheus_client is first imported
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        # Files left by an earlier run would be added to this one's counters.
+        # Only the metric files go; the directory itself belongs to the operator
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+    else:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+
+
+def child_exit(server, worker):
+    from app.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+def run_gunicorn():
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{settings.HOST}:{settings.PORT}")
+            self.cfg.set("workers", settings.WEB_CONCURRENCY)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            # SIGTERM: stop accepting, let in-flight requests finish, then run lifespan shutdown
+            self.cfg.set("graceful_timeout", settings.GRACEFUL_TIMEOUT)
+            self.cfg.set("loglevel", settings.LOG_LEVEL.lower())
+            # Worker recycled or crashed: its live gauges leave the aggregate
+            self.cfg.set("child_exit", child_exit)
+
+        def load(self):
+            from app.main import app
+            return app
+
+    Server().run()
+
+
+def run_uvicorn():
+    uvicorn.run(
+        "app.main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=settings.WEB_CONCURRENCY,
+        timeout_graceful_shutdown=int(settings.GRACEFUL_TIMEOUT),
+        log_level=settings.LOG_LEVEL.lower(),
+    )
+
+
+def main():
+    if settings.WEB_CONCURRENCY > 1:
+        setup_multiprocess_metrics()
+    if settings.INDEX_RECONCILE_ON_STARTUP:
+        asyncio.run(reconcile_indexes())
+        # Forked workers inherit settings, spawned ones read the environment
+        settings.INDEX_RECONCILE_ON_STARTUP = False
+        os.environ["INDEX_RECONCILE_ON_STARTUP"] = "false"
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        run_uvicorn()
+    else:
+        run_gunicorn()
+
+
+if __name__ == "__main__":
+    main()
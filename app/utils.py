@@ -0,0 +1,125 @@
+# app/utils.py
+import base64
+import json
+import re
+from datetime import datetime
+from typing import Optional, Tuple
+from bson import ObjectId
+
+
+def encode_cursor(last_id: ObjectId, sort_field: str = "_id", sort_value=None) -> str:
+    """Opaque page cursor for keyset pagination on (sort_field, _id)"""
+    if sort_field == "_id":
+        raw = str(last_id)
+    else:
+        if isinstance(sort_value, datetime):
+            sort_value = {"$date": sort_value.isoformat()}
+        raw = json.dumps({"id": str(last_id), "f": sort_field, "v": sort_value})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[dict]:
+    """Reverse of encode_cursor: {"_id", "field", "value"}, or None for anything malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        if ObjectId.is_valid(raw):
+            return {"_id": ObjectId(raw), "field": "_id", "value": None}
+        data = json.loads(raw)
+        value = data["v"]
+        if isinstance(value, dict) and "$date" in value:
+            value = datetime.fromisoformat(value["$date"])
+        if not ObjectId.is_valid(data["id"]):
+            return None
+        return {"_id": ObjectId(data["id"]), "field": data["f"], "value": value}
+    except Exception:
+        return None
+
+
+# Fields of a user document that may leave the API. The password hash written
+# by /auth/register lives in the same collection and is never projected.
+def utc_now_ms() -> datetime:
+    """Current UTC time at BSON date precision (milliseconds).
+
+    Documents built from it look the same before the insert as when read
+    back, so a response built without a round-trip matches later reads.
+    """
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+USER_FIELDS = ("name", "surname", "email", "registration_date")
+# `version` is bumped by every write through this API and backs the ETags;
+# it is fetched with every read but never returned
+USER_PROJECTION = {**{field: 1 for field in USER_FIELDS}, "version": 1}
+
+
+def build_projection(fields: Optional[str]) -> dict:
+    """Map a comma separated `fields=` query parameter to a Mongo projection"""
+    if not fields:
+        return USER_PROJECTION
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f != "id" and f not in USER_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return {**{f: 1 for f in requested if f != "id"}, "version": 1}
+
+
+# Sortable fields; email is unique so it needs no _id tie-break
+SORT_FIELDS = ("_id", "name", "surname", "email", "registration_date")
+UNIQUE_SORT_FIELDS = ("_id", "email")
+
+
+def parse_sort(sort: Optional[str]) -> Tuple[str, int]:
+    """"-registration_date" -> ("registration_date", -1); defaults to _id ascending"""
+    if not sort:
+        return "_id", 1
+    direction = -1 if sort.startswith("-") else 1
+    field = sort.lstrip("+-")
+    if field == "id":
+        field = "_id"
+    if field not in SORT_FIELDS:
+        raise ValueError(f"Cannot sort by {field}")
+    return field, direction
+
+
+def sort_spec(field: str, direction: int) -> list:
+    if field in UNIQUE_SORT_FIELDS:
+        return [(field, direction)]
+    return [(field, direction), ("_id", direction)]
+
+
+def keyset_filter(cursor: dict, field: str, direction: int) -> dict:
+    """Documents strictly after the cursor in (field, _id) order.
+
+    Null and missing values (e.g. surname on accounts from /auth/register)
+    sort before everything ascending and after everything descending, but
+    comparison operators never match them, so that block is handled apart.
+    """
+    if cursor["field"] != field:
+        raise ValueError("Cursor does not match sort")
+    op = "$gt" if direction == 1 else "$lt"
+    if field == "_id":
+        return {"_id": {op: cursor["_id"]}}
+    value = cursor["value"]
+    if field in UNIQUE_SORT_FIELDS and value is not None:
+        return {field: {op: value}}
+    null_block = {field: None, "_id": {op: cursor["_id"]}}
+    if value is None:
+        if direction == 1:
+            # Rest of the null block, then every document with a value
+            return {"$or": [null_block, {field: {"$ne": None}}]}
+        # Descending the null block comes last
+        return null_block
+    after = [
+        {field: {op: value}},
+        {field: value, "_id": {op: cursor["_id"]}},
+    ]
+    if direction == -1:
+        after.append({field: None})
+    return {"$or": after}
+
+
+def prefix_regex(prefix: str) -> dict:
+    # Anchored, case-sensitive regexes can use the field index as a range scan
+    return {"$regex": "^" + re.escape(prefix)}
@@ -0,0 +1,254 @@
+# app/webhook_queue.py
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.cache import get_redis
+from app.config import settings
+from app.database import mongodb
+from app.logging_config import logger
+
+EVENTS_COLLECTION = "webhook_events"
+
+# event type -> async handler(payload). Unknown types are stored and marked processed.
+handlers: Dict[str, Callable[[dict], Awaitable[None]]] = {}
+
+def register_handler(event_type: str):
+    def decorator(func):
+        handlers[event_type] = func
+        return func
+    return decorator
+
+
+class SeenFilter:
+    """Front filter in front of the unique index: answers "seen recently?" without Mongo.
+
+    Only a positive answer is trusted; a miss always falls through to the
+    insert, which is the real idempotency check.
+    """
+
+    def __init__(self, backend: str, maxsize: int, ttl: int):
+        self.backend = backend
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._seen = OrderedDict()
+
+    async def seen(self, event_id: str) -> bool:
+        if self.backend == "redis":
+            return bool(await get_redis().exists(f"webhook:{event_id}"))
+        if self.backend == "memory":
+            return event_id in self._seen
+        return False
+
+    async def add(self, event_id: str):
+        if self.backend == "redis":
+            await get_redis().set(f"webhook:{event_id}", 1, ex=self.ttl)
+        elif self.backend == "memory":
+            self._seen[event_id] = True
+            self._seen.move_to_end(event_id)
+            while len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+
+
+class WebhookQueue:
+    """Bounded in-process queue of persisted event ids with a fixed worker pool.
+
+    Events are written to Mongo before they are queued, so a full queue or a
+    restart loses nothing: the sweeper re-queues pending events from the
+    collection whenever there is room. A worker claims an event with a lease
+    (processing_until); events whose lease expired, e.g. because their
+    process died, are reclaimed by any sweeper, while events other live
+    workers are still handling are left alone.
+    """
+
+    def __init__(self, workers: int, maxsize: int, max_attempts: int, retry_delay: float, sweep_interval: float,
+                 lease: float):
+        self.lease = lease
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.sweep_interval = sweep_interval
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self._queued = set()
+        self._tasks = []
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def offer(self, event_id: str) -> bool:
+        """Queue without waiting; False when the queue is full (the sweeper picks it up later)"""
+        if event_id in self._queued:
+            return True
+        try:
+            self.queue.put_nowait(event_id)
+        except asyncio.QueueFull:
+            return False
+        self._queued.add(event_id)
+        return True
+
+    async def _process(self, event_id: str):
+        collection = mongodb.get_collection(EVENTS_COLLECTION)
+        now = datetime.utcnow()
+        lease_id = uuid.uuid4().hex
+        event = await collection.find_one_and_update(
+            {"event_id": event_id, "$or": [
+                {"status": "pending"},
+                {"status": "processing", "processing_until": {"$lte": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "processing",
+                    "lease_id": lease_id,
+                    "processing_until": now + timedelta(seconds=self.lease),
+                },
+                "$inc": {"attempts": 1},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if event is None:
+            return  # already handled, or leased by another worker or process
+        # Later writes only apply while this worker still holds the lease
+        owned = {"_id": event["_id"], "lease_id": lease_id}
+
+        if event["attempts"] > self.max_attempts:
+            # Reclaimed after its last attempt's lease ran out
+            await collection.update_one(
+                owned,
+                {"$set": {"status": "failed", "last_error": "Lease expired", "finished_at": datetime.utcnow()}},
+            )
+            self.failed += 1
+            return
+
+        handler = handlers.get(event["payload"].get("type"))
+        try:
+            if handler is not None:
+                await asyncio.wait_for(handler(event["payload"]), self.lease)
+        except Exception as e:
+            if event["attempts"] >= self.max_attempts:
+                await collection.update_one(
+                    owned,
+                    {"$set": {"status": "failed", "last_error": str(e), "finished_at": datetime.utcnow()}},
+                )
+                self.failed += 1
+                return
+            # Exponential backoff without holding a worker slot
+            delay = self.retry_delay * 2 ** (event["attempts"] - 1)
+            await collection.update_one(
+                owned,
+                {"$set": {
+                    "status": "pending",
+                    "last_error": str(e),
+                    "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+                }},
+            )
+            self.retried += 1
+            asyncio.get_running_loop().call_later(delay, self.offer, event_id)
+            return
+
+        await collection.update_one(
+            owned,
+            {"$set": {"status": "processed", "finished_at": datetime.utcnow()}},
+        )
+        self.processed += 1
+
+    async def _worker(self):
+        while True:
+            event_id = await self.queue.get()
+            self._queued.discard(event_id)
+            try:
+                await self._process(event_id)
+            except Exception as e:
+                logger.exception("webhook_worker_error", extra={"fields": {"event_id": event_id}})
+            finally:
+                self.queue.task_done()
+
+    async def _sweeper(self):
+        collection = mongodb.get_collection(EVENTS_COLLECTION)
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            room = self.queue.maxsize - self.queue.qsize()
+            if room <= 0:
+                continue
+            try:
+                now = datetime.utcnow()
+                cursor = collection.find(
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"event_id": 1},
+                ).sort("next_attempt_at", 1).limit(room)
+                async for event in cursor:
+                    self.offer(event["event_id"])
+                expired = collection.find(
+                    {"status": "processing", "processing_until": {"$lte": now}},
+                    {"event_id": 1},
+                ).limit(room)
+                async for event in expired:
+                    self.offer(event["event_id"])
+            except Exception as e:
+                logger.warning("webhook_sweep_failed", extra={"fields": {"error": str(e)}})
+
+    async def start(self):
+        # Events left in "processing" by a dead process are reclaimed by the
+        # sweeper once their lease expires, never while another worker holds them
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self, timeout: float = 10.0):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass  # unfinished events stay pending in Mongo
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "maxsize": self.queue.maxsize,
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+
+async def ingest(event_id: str, payload: dict) -> str:
+    """Persist an event once; returns "accepted" or "duplicate" """
+    if await seen_filter.seen(event_id):
+        return "duplicate"
+    now = datetime.utcnow()
+    try:
+        await mongodb.get_collection(EVENTS_COLLECTION).insert_one({
+            "event_id": event_id,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "received_at": now,
+            "next_attempt_at": now,
+        })
+    except DuplicateKeyError:
+        await seen_filter.add(event_id)
+        return "duplicate"
+    await seen_filter.add(event_id)
+    webhook_queue.offer(event_id)
+    return "accepted"
+
+
+seen_filter = SeenFilter(
+    backend=settings.WEBHOOK_DEDUP_BACKEND,
+    maxsize=settings.WEBHOOK_DEDUP_MAXSIZE,
+    ttl=settings.WEBHOOK_DEDUP_TTL,
+)
+
+webhook_queue = WebhookQueue(
+    workers=settings.WEBHOOK_WORKERS,
+    maxsize=settings.WEBHOOK_QUEUE_SIZE,
+    max_attempts=settings.WEBHOOK_MAX_ATTEMPTS,
+    retry_delay=settings.WEBHOOK_RETRY_DELAY,
+    sweep_interval=settings.WEBHOOK_SWEEP_INTERVAL,
+    lease=settings.WEBHOOK_LEASE_SECONDS,
+)
@@ -0,0 +1,98 @@
+# app/write_behind.py
+import asyncio
+import time
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.cache import user_cache, principal_cache
+from app.config import settings
+from app.database import mongodb
+from app.logging_config import logger
+from app.metrics import WRITE_BEHIND_FLUSH_LATENCY, WRITE_BEHIND_FLUSHED, WRITE_BEHIND_FAILED
+
+
+class WriteBehindQueue:
+    """Coalesces deferred $set updates per _id and flushes them with bulk_write.
+
+    Later updates for the same document overwrite earlier values field by
+    field (last write wins). A flush runs when `max_batch` documents are
+    pending or every `interval` seconds, whichever comes first. Pending
+    updates live only in this process until flushed, so the mode is meant for
+    low-criticality fields; shutdown flushes whatever is left.
+    """
+
+    def __init__(self, collection_name: str, max_batch: int, interval: float):
+        self.collection_name = collection_name
+        self.max_batch = max_batch
+        self.interval = interval
+        self._pending = {}
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, user_id: ObjectId, update_data: dict):
+        self._pending.setdefault(user_id, {}).update(update_data)
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            started = time.perf_counter()
+            operations = [UpdateOne({"_id": user_id}, {"$set": fields, "$inc": {"version": 1}}) for user_id, fields in batch.items()]
+            try:
+                await mongodb.get_collection(self.collection_name).bulk_write(operations, ordered=False)
+                WRITE_BEHIND_FLUSHED.inc(len(operations))
+            except BulkWriteError as e:
+                failed = len(e.details.get("writeErrors", []))
+                WRITE_BEHIND_FAILED.inc(failed)
+                WRITE_BEHIND_FLUSHED.inc(len(operations) - failed)
+            except Exception as e:
+                # Put the batch back under anything queued since; newer values win
+                for user_id, fields in batch.items():
+                    self._pending[user_id] = {**fields, **self._pending.get(user_id, {})}
+                logger.warning("write_behind_flush_failed", extra={"fields": {"error": str(e), "requeued": len(batch)}})
+                return
+            finally:
+                WRITE_BEHIND_FLUSH_LATENCY.observe(time.perf_counter() - started)
+            ids = [str(user_id) for user_id in batch]
+            await user_cache.delete(*ids)
+            await principal_cache.delete(*ids)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Not cancelled: a flush in progress has already taken its batch out
+        # of _pending and must finish (or requeue it) before the client closes
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+user_write_behind = WriteBehindQueue(
+    "users",
+    max_batch=settings.USERS_WRITE_BEHIND_MAX_BATCH,
+    interval=settings.USERS_WRITE_BEHIND_INTERVAL,
+)
@@ -0,0 +1,31 @@
+# bench/weather_stub.py
+"""Local stand-in for the weather upstream.
+
+Counts calls per city and answers after a configurable delay, so
+coalescing and stale-while-revalidate can be observed without the real API:
+
+    STUB_DELAY=0.5 uvicorn bench.weather_stub:app --port 9000
+    WEATHER_API_URL=http://localhost:9000/weather uvicorn app.main:app
+    curl localhost:9000/calls
+"""
+import asyncio
+import os
+from collections import Counter
+
+from fastapi import FastAPI
+
+app = FastAPI(title="Weather stub")
+calls = Counter()
+DELAY = float(os.getenv("STUB_DELAY", "0.2"))
+
+
+@app.get("/weather")
+async def weather(q: str, appid: str = ""):
+    calls[q.lower()] += 1
+    await asyncio.sleep(DELAY)
+    return {"name": q, "main": {"temp": 280.0 + calls[q.lower()]}}
+
+
+@app.get("/calls")
+async def get_calls():
+    return dict(calls)
@@ -0,0 +1,26 @@
+# tests/conftest.py
+import asyncio
+import pytest
+
+
+class FakeCursor:
+    """Async iteration over a list of documents, like a driver cursor"""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        self._iter = iter(self.documents)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion on a fresh event loop"""
+    return asyncio.run
@@ -0,0 +1,93 @@
+# tests/test_bulk.py
+from types import SimpleNamespace
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from app.routers import bulk
+from tests.conftest import FakeCursor
+
+
+class FakeUsers:
+    """insert_many/bulk_write that reject duplicate emails like the unique index"""
+
+    def __init__(self, documents=()):
+        self.documents = {doc["_id"]: doc for doc in documents}
+
+    def _taken(self, email, own_id=None):
+        return any(doc["email"] == email and _id != own_id for _id, doc in self.documents.items())
+
+    def _raise(self, errors, **counts):
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, **counts})
+
+    async def insert_many(self, documents, ordered=True):
+        errors = []
+        for position, doc in enumerate(documents):
+            doc.setdefault("_id", ObjectId())
+            if self._taken(doc["email"]):
+                errors.append({"index": position, "code": 11000, "errmsg": "E11000 duplicate key"})
+            else:
+                self.documents[doc["_id"]] = doc
+        self._raise(errors)
+
+    def find(self, query, projection=None):
+        ids = query["_id"]["$in"]
+        return FakeCursor([{"_id": _id} for _id in ids if _id in self.documents])
+
+    async def bulk_write(self, operations, ordered=True):
+        errors = []
+        matched = 0
+        for position, op in enumerate(operations):
+            _id = op._filter["_id"]
+            changes = op._doc["$set"]
+            if "email" in changes and self._taken(changes["email"], _id):
+                errors.append({"index": position, "code": 11000, "errmsg": "E11000 duplicate key"})
+                continue
+            self.documents[_id].update(changes)
+            matched += 1
+        self._raise(errors, nMatched=matched, nModified=matched)
+        return SimpleNamespace(matched_count=matched, modified_count=matched)
+
+
+def user(email):
+    return {"name": "A", "surname": "B", "email": email}
+
+
+def test_insert_batch_maps_errors_to_request_indexes(run):
+    collection = FakeUsers([{"_id": ObjectId(), **user("taken@example.com")}])
+    batch = [(3, user("a@example.com")), (7, user("taken@example.com")), (9, user("b@example.com"))]
+
+    results = run(bulk.insert_batch(collection, batch))
+
+    assert [(r["index"], r["status"]) for r in results] == [(3, "created"), (7, "error"), (9, "created")]
+    assert results[1]["error"] == bulk.DUPLICATE_EMAIL
+    assert results[2]["id"] == str(batch[2][1]["_id"])
+
+
+def test_bulk_update_maps_results_across_flushes(monkeypatch, run):
+    first, second, missing = ObjectId(), ObjectId(), ObjectId()
+    collection = FakeUsers([
+        {"_id": first, **user("first@example.com")},
+        {"_id": second, **user("second@example.com")},
+    ])
+    monkeypatch.setattr(bulk.mongodb, "get_collection", lambda name: collection)
+    monkeypatch.setattr(bulk.settings, "USERS_BULK_BATCH_SIZE", 2)
+    updates = [
+        bulk.UserBulkUpdate(id="not-an-id", name="Xx"),
+        bulk.UserBulkUpdate(id=str(missing), name="Xx"),
+        bulk.UserBulkUpdate(id=str(first), email="second@example.com"),
+        bulk.UserBulkUpdate(id=str(second), name="Renamed"),
+        bulk.UserBulkUpdate(id=str(first), name="Also renamed"),
+    ]
+
+    summary = run(bulk.bulk_update_users(updates))
+
+    assert [(r["index"], r["status"], r.get("error")) for r in summary["results"]] == [
+        (0, "error", "Invalid user id"),
+        (1, "error", "User not found"),
+        (2, "error", bulk.DUPLICATE_EMAIL),
+        (3, "updated", None),
+        (4, "updated", None),
+    ]
+    assert summary["matched"] == 2
+    assert collection.documents[second]["name"] == "Renamed"
+    assert collection.documents[first]["email"] == "first@example.com"
@@ -0,0 +1,57 @@
+# tests/test_cache.py
+import asyncio
+from redis.exceptions import ConnectionError as RedisConnectionError
+from app import cache
+from app.cache import LRUCache, RedisCache
+
+
+def test_lru_evicts_least_recently_used(run):
+    cache = LRUCache(maxsize=2, ttl=60)
+
+    async def scenario():
+        await cache.set("a", {"v": 1})
+        await cache.set("b", {"v": 2})
+        await cache.get("a")
+        await cache.set("c", {"v": 3})
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert run(scenario()) == [{"v": 1}, None, {"v": 3}]
+    assert cache.evictions == 1
+
+
+def test_tombstone_blocks_stale_read_through(run):
+    cache = LRUCache(maxsize=10, ttl=60, tombstone_ttl=0.05)
+
+    async def scenario():
+        # A reader loaded the old document, then a write invalidated the key
+        await cache.delete("u1")
+        stored_stale = await cache.add("u1", {"name": "old"})
+        hidden = await cache.get("u1")
+        await asyncio.sleep(0.06)
+        stored_fresh = await cache.add("u1", {"name": "new"})
+        return stored_stale, hidden, stored_fresh, await cache.get("u1")
+
+    assert run(scenario()) == (False, None, True, {"name": "new"})
+
+
+class DownRedis:
+    async def get(self, key):
+        raise RedisConnectionError("Connection refused")
+
+    async def set(self, *args, **kwargs):
+        raise RedisConnectionError("Connection refused")
+
+    def pipeline(self, transaction=True):
+        raise RedisConnectionError("Connection refused")
+
+
+def test_redis_outage_degrades_to_misses(monkeypatch, run):
+    monkeypatch.setattr(cache, "get_redis", lambda: DownRedis())
+    redis_cache = RedisCache(prefix="user:", ttl=60, tombstone_ttl=5)
+
+    async def scenario():
+        await redis_cache.delete("u1")
+        return await redis_cache.get("u1"), await redis_cache.add("u1", {"name": "x"})
+
+    assert run(scenario()) == (None, False)
+    assert redis_cache.errors == 3
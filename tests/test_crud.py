@@ -0,0 +1,79 @@
+# tests/test_crud.py
+from datetime import datetime
+import bson
+import pytest
+from bson import ObjectId
+from app import crud
+from app.models import UserCreate
+
+
+class FakeFind:
+    def __init__(self, documents, query):
+        after = query.get("_id", {}).get("$gt")
+        self.documents = [doc for doc in documents if after is None or doc["_id"] > after]
+
+    def sort(self, field, direction):
+        self.documents.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.documents = self.documents[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+
+class FakeUsers:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def with_options(self, **options):
+        return self
+
+    def find(self, query, projection=None):
+        return FakeFind(self.documents, query)
+
+    async def insert_one(self, document):
+        # What Mongo would store and hand back
+        self.documents.append(bson.decode(bson.encode(document)))
+
+
+@pytest.fixture
+def users(monkeypatch):
+    collection = FakeUsers([
+        {"_id": ObjectId(), "name": f"User{i}", "surname": "Test", "email": f"u{i}@example.com",
+         "registration_date": datetime(2024, 1, 1), "version": 1}
+        for i in range(5)
+    ])
+
+    async def get_database():
+        return {"users": collection}
+
+    monkeypatch.setattr(crud, "get_database", get_database)
+    return collection
+
+
+def test_get_all_users_pages_by_id(users, run):
+    async def scenario():
+        pages, after = [], None
+        while True:
+            page, after = await crud.user_crud.get_all_users(limit=2, after=after)
+            pages.append([user.email for user in page])
+            if after is None:
+                return pages
+
+    assert run(scenario()) == [["u0@example.com", "u1@example.com"], ["u2@example.com", "u3@example.com"], ["u4@example.com"]]
+
+
+def test_get_all_users_returns_string_ids(users, run):
+    page, after = run(crud.user_crud.get_all_users(limit=10))
+    assert after is None
+    assert [user.id for user in page] == [str(doc["_id"]) for doc in users.documents]
+
+
+def test_create_user_stores_an_object_id(users, run):
+    created = run(crud.user_crud.create_user(UserCreate(name="Ann", surname="Lee", email="ann@example.com")))
+    stored = users.documents[-1]
+    assert type(stored["_id"]) is ObjectId and stored["_id"] == created.id
+    assert stored["registration_date"] == created.registration_date
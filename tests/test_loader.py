@@ -0,0 +1,63 @@
+# tests/test_loader.py
+import asyncio
+from bson import ObjectId
+from app import loader
+from app.loader import BatchLoader
+from tests.conftest import FakeCursor
+
+
+class RecordingCollection:
+    def __init__(self, documents):
+        self.documents = {doc["_id"]: doc for doc in documents}
+        self.queries = []
+
+    def find(self, query, projection=None):
+        ids = query["_id"]["$in"]
+        self.queries.append(ids)
+        return FakeCursor([self.documents[_id] for _id in ids if _id in self.documents])
+
+
+def test_concurrent_lookups_share_one_query(monkeypatch, run):
+    present = [{"_id": ObjectId(), "name": f"u{i}"} for i in range(3)]
+    missing = ObjectId()
+    collection = RecordingCollection(present)
+    monkeypatch.setattr(loader.mongodb, "get_read_collection", lambda name: collection)
+
+    async def scenario():
+        batch = BatchLoader("users", projection={}, max_batch=100, wait=0.005)
+        ids = [doc["_id"] for doc in present] + [present[0]["_id"], missing]
+        return await asyncio.gather(*(batch.load(_id) for _id in ids))
+
+    results = run(scenario())
+    assert len(collection.queries) == 1
+    assert len(collection.queries[0]) == 4  # duplicates collapsed
+    assert results[:3] == present
+    assert results[3] is results[0]
+    assert results[4] is None
+
+
+def test_full_batch_dispatches_without_waiting(monkeypatch, run):
+    documents = [{"_id": ObjectId()} for _ in range(5)]
+    collection = RecordingCollection(documents)
+    monkeypatch.setattr(loader.mongodb, "get_read_collection", lambda name: collection)
+
+    async def scenario():
+        batch = BatchLoader("users", projection={}, max_batch=2, wait=60)
+        return await asyncio.wait_for(asyncio.gather(*(batch.load(d["_id"]) for d in documents[:4])), 1)
+
+    assert run(scenario()) == documents[:4]
+    assert [len(ids) for ids in collection.queries] == [2, 2]
+
+
+def test_errors_reach_every_waiter(monkeypatch, run):
+    class Broken:
+        def find(self, query, projection=None):
+            raise RuntimeError("down")
+
+    monkeypatch.setattr(loader.mongodb, "get_read_collection", lambda name: Broken())
+
+    async def scenario():
+        batch = BatchLoader("users", projection={}, max_batch=100, wait=0.001)
+        return await asyncio.gather(batch.load(ObjectId()), batch.load(ObjectId()), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in run(scenario()))
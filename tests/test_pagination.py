@@ -0,0 +1,102 @@
+# tests/test_pagination.py
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from app.utils import decode_cursor, encode_cursor, keyset_filter
+
+
+def _compare(value, op, target):
+    # Mongo type bracketing: comparisons never match null or missing values
+    if value is None or target is None:
+        return False
+    return value > target if op == "$gt" else value < target
+
+
+def matches(doc: dict, query: dict) -> bool:
+    """Enough of Mongo's query semantics for keyset filters"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(condition, dict):
+            for op, target in condition.items():
+                if op == "$ne":
+                    if value == target:
+                        return False
+                elif not _compare(value, op, target):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def sort_key(field):
+    def key(doc):
+        value = doc.get(field)
+        # Null and missing sort lowest ascending
+        rank = (0, "") if value is None else (1, value)
+        return rank, doc["_id"]
+    return key
+
+
+def paginate(docs, field, direction, page_size):
+    ordered = sorted(docs, key=sort_key(field), reverse=direction == -1)
+    seen = []
+    cursor = None
+    while True:
+        remaining = ordered if cursor is None else [d for d in ordered if matches(d, keyset_filter(cursor, field, direction))]
+        page = remaining[:page_size]
+        seen.extend(page)
+        if len(remaining) <= page_size:
+            return seen
+        last = page[-1]
+        cursor = decode_cursor(encode_cursor(last["_id"], field, last.get(field)))
+
+
+def users_with_missing_surnames():
+    docs = []
+    for i in range(7):
+        docs.append({"_id": ObjectId(), "name": f"n{i}"})  # from /auth/register, no surname
+    for surname in ["Brown", "Adams", "Clark", "Adams", "Young"]:
+        docs.append({"_id": ObjectId(), "surname": surname})
+    docs.append({"_id": ObjectId(), "surname": None})
+    return docs
+
+
+def test_cursor_roundtrip_keeps_datetime_and_id():
+    last_id = ObjectId()
+    when = datetime(2024, 5, 1, 12, 30)
+    cursor = decode_cursor(encode_cursor(last_id, "registration_date", when))
+    assert cursor == {"_id": last_id, "field": "registration_date", "value": when}
+    assert decode_cursor(encode_cursor(last_id)) == {"_id": last_id, "field": "_id", "value": None}
+
+
+def test_malformed_cursor_is_rejected():
+    assert decode_cursor("not-a-cursor") is None
+
+
+def test_ascending_pages_cross_the_null_block():
+    docs = users_with_missing_surnames()
+    for page_size in (1, 2, 3, 5, 8):
+        result = paginate(docs, "surname", 1, page_size)
+        assert sorted(d["_id"] for d in result) == sorted(d["_id"] for d in docs)
+        assert len(result) == len(docs)
+
+
+def test_descending_pages_reach_the_null_block():
+    docs = users_with_missing_surnames()
+    for page_size in (1, 2, 4, 6):
+        result = paginate(docs, "surname", -1, page_size)
+        assert len(result) == len(docs)
+        assert {d["_id"] for d in result} == {d["_id"] for d in docs}
+        # Documents with a surname come first, the null block last
+        with_surname = [d for d in result if d.get("surname") is not None]
+        assert result[:len(with_surname)] == with_surname
+
+
+def test_cursor_for_other_sort_is_refused():
+    cursor = decode_cursor(encode_cursor(ObjectId(), "name", "x"))
+    with pytest.raises(ValueError):
+        keyset_filter(cursor, "surname", 1)
@@ -0,0 +1,55 @@
+# tests/test_passwords.py
+import asyncio
+import hashlib
+import pytest
+from passlib.context import CryptContext
+from app import passwords
+
+
+@pytest.fixture(autouse=True)
+def cheap_kdf(monkeypatch):
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    monkeypatch.setattr(passwords, "pwd_context", context)
+    return context
+
+
+def legacy_hash(password, salt="s4lt"):
+    return salt + "$" + hashlib.sha256((password + salt).encode()).hexdigest()
+
+
+def test_legacy_hash_verifies_and_is_rehashed(cheap_kdf):
+    valid, new_hash = passwords._verify("secret", legacy_hash("secret"))
+    assert valid
+    assert new_hash.startswith("$2b$")
+    assert cheap_kdf.verify("secret", new_hash)
+
+
+def test_wrong_password_against_legacy_hash():
+    assert passwords._verify("wrong", legacy_hash("secret")) == (False, None)
+    assert passwords._verify("secret", "not-a-legacy-hash") == (False, None)
+
+
+def test_outdated_cost_is_rehashed(cheap_kdf, monkeypatch):
+    stored = cheap_kdf.hash("secret")
+    monkeypatch.setattr(passwords, "pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=5))
+    valid, new_hash = passwords._verify("secret", stored)
+    assert valid
+    assert new_hash.startswith("$2b$05$")
+    assert passwords._verify("secret", new_hash) == (True, None)
+
+
+def test_pool_rejects_when_saturated(run):
+    hasher = passwords.PasswordHasher(kind="thread", workers=1, queue_size=1)
+
+    async def scenario():
+        tasks = [asyncio.ensure_future(hasher.hash("secret")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(passwords.PasswordPoolBusy):
+            await hasher.hash("secret")
+        return await asyncio.gather(*tasks)
+
+    try:
+        assert len(run(scenario())) == 2
+        assert hasher.rejected == 1
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,47 @@
+# tests/test_ratelimit.py
+import time
+import pytest
+from starlette.requests import Request
+from app.config import settings
+from app.ratelimit import MemoryRateLimiter, client_ip
+
+
+def make_request(forwarded=None, peer="10.0.0.1"):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 4321)})
+
+
+def test_token_bucket_limits_and_refills(monkeypatch, run):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    limiter = MemoryRateLimiter(maxsize=10)
+
+    assert run(limiter.hit("k", 2, 10)) is None
+    assert run(limiter.hit("k", 2, 10)) is None
+    assert run(limiter.hit("k", 2, 10)) == pytest.approx(5)
+    assert run(limiter.hit("other", 2, 10)) is None
+    now[0] += 5
+    assert run(limiter.hit("k", 2, 10)) is None
+
+
+def test_least_recent_keys_are_dropped(run):
+    limiter = MemoryRateLimiter(maxsize=2)
+    for key in ("a", "b", "c"):
+        run(limiter.hit(key, 1, 60))
+    assert list(limiter._buckets) == ["b", "c"]
+
+
+def test_client_ip_ignores_forwarded_header_by_default(monkeypatch):
+    monkeypatch.setattr(settings, "TRUST_PROXY_HEADERS", False)
+    assert client_ip(make_request("1.2.3.4")) == "10.0.0.1"
+
+
+def test_client_ip_takes_entry_added_by_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(settings, "TRUST_PROXY_HEADERS", True)
+    monkeypatch.setattr(settings, "TRUSTED_PROXY_HOPS", 1)
+    # The client forged the first entry; the proxy appended the real address
+    assert client_ip(make_request("6.6.6.6, 203.0.113.7")) == "203.0.113.7"
+    monkeypatch.setattr(settings, "TRUSTED_PROXY_HOPS", 2)
+    assert client_ip(make_request("6.6.6.6, 203.0.113.7, 10.1.1.1")) == "203.0.113.7"
+    # Shorter chain than configured: fall back to the peer address
+    assert client_ip(make_request("203.0.113.7")) == "10.0.0.1"
@@ -0,0 +1,145 @@
+# tests/test_resilience.py
+import time
+from types import SimpleNamespace
+import pytest
+from app import resilience
+from app.resilience import CLOSED, HALF_OPEN, OPEN, BreakerListener, CircuitBreaker, is_availability_failure, parse_deadlines
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_breaker():
+    return CircuitBreaker(window=10, min_calls=4, failure_rate=0.5, slow_call=1.0, open_for=5, half_open_calls=2)
+
+
+def test_opens_at_failure_rate_after_min_calls(clock):
+    breaker = make_breaker()
+    breaker.record(0.01, False)
+    breaker.record(0.01, False)
+    breaker.record(0.01, True)
+    assert breaker.state == CLOSED  # below min_calls
+    breaker.record(0.01, True)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_slow_calls_count_unless_untimed(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(5.0, True, timed=False)
+    assert breaker.state == CLOSED
+    for _ in range(4):
+        breaker.record(5.0, True)
+    assert breaker.state == OPEN
+
+
+def test_slow_calls_judged_against_route_deadline(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(5.0, True, deadline=60.0)
+    assert breaker.state == CLOSED
+    for _ in range(4):
+        breaker.record(61.0, True, deadline=60.0)
+    assert breaker.state == OPEN
+
+
+def command(name, seconds):
+    return SimpleNamespace(command_name=name, duration_micros=int(seconds * 1e6), failure=None)
+
+
+def test_listener_times_only_commands_issued_by_routes(clock, monkeypatch):
+    breaker = make_breaker()
+    monkeypatch.setattr(resilience, "db_breaker", breaker)
+    listener = BreakerListener()
+    # Background work (write-behind, index builds) has no route deadline
+    for _ in range(4):
+        listener.succeeded(command("update", 5.0))
+    assert breaker.state == CLOSED
+
+    token = resilience._route_deadline.set(60.0)
+    try:
+        for _ in range(4):
+            listener.succeeded(command("aggregate", 5.0))
+        assert breaker.state == CLOSED
+    finally:
+        resilience._route_deadline.reset(token)
+
+    clock[0] += 11
+    token = resilience._route_deadline.set(1.0)
+    try:
+        for _ in range(4):
+            listener.succeeded(command("find", 5.0))
+        assert breaker.state == OPEN
+    finally:
+        resilience._route_deadline.reset(token)
+
+
+def test_old_buckets_leave_the_window(clock):
+    breaker = make_breaker()
+    breaker.record(0.01, False)
+    breaker.record(0.01, False)
+    clock[0] += 11
+    breaker.record(0.01, True)
+    breaker.record(0.01, True)
+    breaker.record(0.01, False)
+    breaker.record(0.01, True)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probes_then_close(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(0.01, False)
+    clock[0] += 5
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only half_open_calls probes
+    breaker.record(0.01, True)
+    breaker.record(0.01, True)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(0.01, False)
+    clock[0] += 5
+    assert breaker.allow()
+    breaker.record(0.01, False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == pytest.approx(5)
+
+
+def test_probes_that_never_reach_mongo_do_not_wedge_half_open(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(0.01, False)
+    clock[0] += 5
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+    clock[0] += 5
+    assert breaker.allow()
+
+
+def test_only_availability_failures_count():
+    assert not is_availability_failure({"ok": 0, "code": 11000, "errmsg": "E11000 duplicate key"})
+    assert not is_availability_failure({"ok": 0, "code": 27, "errmsg": "text index required"})
+    assert is_availability_failure({"ok": 0, "code": 50, "errmsg": "operation exceeded time limit"})
+    assert is_availability_failure({"ok": 0, "code": 10107, "errmsg": "not primary"})
+    # Network errors and client-side timeouts carry no server code
+    assert is_availability_failure({"errmsg": "connection closed", "errtype": "AutoReconnect"})
+
+
+def test_parse_deadlines():
+    assert parse_deadlines("GET /users/=3000, post /users/bulk=60000,,GET /users/export=0") == {
+        ("GET", "/users/"): 3.0,
+        ("POST", "/users/bulk"): 60.0,
+        ("GET", "/users/export"): 0.0,
+    }
@@ -0,0 +1,111 @@
+# tests/test_revocation.py
+import time
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+from app import auth, deps, revocation
+from app.revocation import RefreshTokenStore, RevocationList
+from app.routers import auth as auth_router
+from tests.conftest import FakeCursor
+
+
+class FakeTokens:
+    """_id-keyed documents with the operations the token stores use"""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def insert_one(self, document):
+        self.documents[document["_id"]] = document
+
+    async def find_one_and_delete(self, query):
+        return self.documents.pop(query["_id"], None)
+
+    async def delete_one(self, query):
+        self.documents.pop(query["_id"], None)
+
+    def find(self, query, projection=None):
+        def matches(doc):
+            if doc["expires_at"] <= query["expires_at"]["$gt"]:
+                return False
+            return "revoked_at" not in query or doc["revoked_at"] >= query["revoked_at"]["$gte"]
+        return FakeCursor([doc for doc in self.documents.values() if matches(doc)])
+
+
+@pytest.fixture
+def collections(monkeypatch):
+    stores = {}
+    monkeypatch.setattr(revocation.mongodb, "get_collection", lambda name: stores.setdefault(name, FakeTokens()))
+    monkeypatch.setattr(auth.settings, "SECRET_KEY", "test-secret")
+    monkeypatch.setattr(auth, "_decoded_tokens", auth._decoded_tokens.__class__())
+    return stores
+
+
+def test_refresh_token_is_single_use(collections, monkeypatch, run):
+    store = RefreshTokenStore("refresh_tokens")
+    monkeypatch.setattr(auth_router, "refresh_tokens", store)
+    token = auth.create_refresh_token("user1")
+
+    async def scenario():
+        await store.add(token)
+        rotated = await auth_router.refresh(auth_router.RefreshRequest(refresh_token=token))
+        with pytest.raises(HTTPException) as reused:
+            await auth_router.refresh(auth_router.RefreshRequest(refresh_token=token))
+        return rotated, reused.value
+
+    rotated, reused = run(scenario())
+    assert reused.status_code == 401
+    new_jti = jwt.get_unverified_claims(rotated["refresh_token"])["jti"]
+    assert list(collections["refresh_tokens"].documents) == [new_jti]
+
+
+def test_refresh_token_without_jti_is_rejected(collections, run):
+    legacy = jwt.encode({"sub": "user1", "type": "refresh", "exp": time.time() + 60}, "test-secret", algorithm="HS256")
+    with pytest.raises(HTTPException) as rejected:
+        run(auth_router.refresh(auth_router.RefreshRequest(refresh_token=legacy)))
+    assert rejected.value.status_code == 401
+
+
+def test_access_token_without_jti_is_rejected(collections, run):
+    legacy = jwt.encode({"sub": "user1", "type": "access", "exp": time.time() + 60}, "test-secret", algorithm="HS256")
+    with pytest.raises(HTTPException):
+        run(deps.access_payload(legacy))
+    assert run(deps.access_payload(auth.create_access_token("user1")))["sub"] == "user1"
+
+
+def payload(jti, expires_in=60):
+    return {"jti": jti, "sub": "user1", "exp": time.time() + expires_in}
+
+
+def test_sync_picks_up_revocations_from_other_workers(collections, run):
+    this_worker = RevocationList("revoked_tokens", interval=5)
+    other_worker = RevocationList("revoked_tokens", interval=5)
+
+    async def scenario():
+        await this_worker.sync()
+        await other_worker.revoke(payload("a"))
+        before = this_worker.is_revoked("a")
+        await this_worker.sync()
+        return before
+
+    assert run(scenario()) is False
+    assert this_worker.is_revoked("a")
+    assert not this_worker.is_revoked("b")
+    assert this_worker.syncs == 2
+
+
+def test_sync_is_incremental_and_prunes_expired(collections, run):
+    revoked = RevocationList("revoked_tokens", interval=5)
+    documents = collections.setdefault("revoked_tokens", FakeTokens()).documents
+    now = datetime.utcnow()
+    documents["old"] = {"_id": "old", "expires_at": now + timedelta(minutes=5), "revoked_at": now - timedelta(minutes=1)}
+
+    async def scenario():
+        revoked._synced_at = now  # a previous sync already covered "old"
+        revoked._revoked["gone"] = time.time() - 1
+        await revoked.sync()
+
+    run(scenario())
+    assert not revoked.is_revoked("old")
+    assert "gone" not in revoked._revoked
@@ -0,0 +1,39 @@
+# tests/test_serialization.py
+import bson
+from starlette.requests import Request
+from app.serialization import list_etag, not_modified, user_etag, user_to_dict
+from app.utils import utc_now_ms
+
+
+def request_with(if_none_match=None):
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_weak_comparison_matches_with_or_without_w_prefix():
+    etag = user_etag("abc", 3)
+    for header in ('W/"abc.3"', '"abc.3"', 'W/"other", W/"abc.3"', "*"):
+        response = not_modified(request_with(header), etag)
+        assert response is not None and response.status_code == 304, header
+        assert response.headers["etag"] == etag
+
+
+def test_changed_version_or_missing_header_is_not_a_match():
+    etag = user_etag("abc", 3)
+    assert not_modified(request_with('W/"abc.2"'), etag) is None
+    assert not_modified(request_with('"abc.3-gzip"'), etag) is None
+    assert not_modified(request_with(), etag) is None
+
+
+def test_list_etag_depends_on_versions_and_extra():
+    page = [("a", 1), ("b", 2)]
+    assert list_etag(page) == list_etag(list(page))
+    assert list_etag(page) != list_etag([("a", 1), ("b", 3)])
+    assert list_etag(page) != list_etag(page, extra="sort=name")
+    assert list_etag(page).startswith('W/"')
+
+
+def test_response_before_insert_matches_stored_document():
+    user = {"_id": bson.ObjectId(), "name": "A", "surname": "B", "email": "a@example.com", "registration_date": utc_now_ms()}
+    stored = bson.decode(bson.encode(user))
+    assert user_to_dict(user) == user_to_dict(stored)
@@ -0,0 +1,80 @@
+# tests/test_weather.py
+import asyncio
+import time
+from app.cache import SingleFlight
+from app.routers import external
+
+
+def test_single_flight_coalesces_concurrent_calls(run):
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": len(calls)}
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("k", fetch) for _ in range(5)))
+
+    assert run(scenario()) == [{"value": 1}] * 5
+    assert len(calls) == 1
+    assert flight.coalesced == 4
+    assert not flight.in_flight("k")
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+def test_weather_serves_stale_and_revalidates_once(monkeypatch, run):
+    calls = []
+
+    async def fake_fetch(city, key):
+        calls.append(city)
+        await asyncio.sleep(0.01)
+        entry = {"data": {"temp": "fresh"}, "fetched_at": time.time()}
+        await external.weather_l1.set(key, entry)
+        return entry
+
+    monkeypatch.setattr(external, "fetch_weather", fake_fetch)
+    monkeypatch.setattr(external, "get_redis", lambda: FakeRedis())
+
+    async def scenario():
+        await external.weather_l1.clear()
+        stale_at = time.time() - external.settings.WEATHER_FRESH_TTL - 1
+        await external.weather_l1.set("weather:oslo", {"data": {"temp": "stale"}, "fetched_at": stale_at})
+        served = await asyncio.gather(*(external.get_weather("Oslo") for _ in range(5)))
+        await asyncio.gather(*list(external._background))
+        return served, await external.get_weather("Oslo")
+
+    served, after = run(scenario())
+    assert served == [{"temp": "stale"}] * 5
+    assert calls == ["Oslo"]
+    assert after == {"temp": "fresh"}
+
+
+def test_weather_miss_shares_one_upstream_call(monkeypatch, run):
+    calls = []
+
+    async def fake_fetch(city, key):
+        calls.append(city)
+        await asyncio.sleep(0.01)
+        return {"data": {"temp": 1}, "fetched_at": time.time()}
+
+    monkeypatch.setattr(external, "fetch_weather", fake_fetch)
+    monkeypatch.setattr(external, "get_redis", lambda: FakeRedis())
+
+    async def scenario():
+        await external.weather_l1.clear()
+        return await asyncio.gather(*(external.get_weather("Rome") for _ in range(4)))
+
+    assert run(scenario()) == [{"temp": 1}] * 4
+    assert calls == ["Rome"]
@@ -0,0 +1,126 @@
+# tests/test_webhook_queue.py
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app import webhook_queue as wq
+
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict):
+            if "$lte" in condition and not (key in doc and doc[key] <= condition["$lte"]):
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+class FakeEvents:
+    """The find_one_and_update/update_one subset _process uses"""
+
+    def __init__(self, *events):
+        self.events = list(events)
+
+    def _apply(self, doc, update):
+        doc.update(update.get("$set", {}))
+        for key, amount in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + amount
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        for doc in self.events:
+            if matches(doc, query):
+                self._apply(doc, update)
+                return dict(doc)
+        return None
+
+    async def update_one(self, query, update):
+        for doc in self.events:
+            if matches(doc, query):
+                self._apply(doc, update)
+                return
+
+
+def event(**fields):
+    return {"_id": ObjectId(), "event_id": "e1", "payload": {"type": "test"}, "status": "pending", "attempts": 0, **fields}
+
+
+@pytest.fixture
+def events(monkeypatch):
+    collection = FakeEvents()
+    monkeypatch.setattr(wq.mongodb, "get_collection", lambda name: collection)
+    return collection
+
+
+def make_queue(max_attempts=3):
+    return wq.WebhookQueue(workers=1, maxsize=10, max_attempts=max_attempts, retry_delay=60, sweep_interval=5, lease=30)
+
+
+def test_claims_pending_event(events, monkeypatch, run):
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload)
+
+    monkeypatch.setitem(wq.handlers, "test", handler)
+    events.events.append(event())
+    run(make_queue()._process("e1"))
+    assert calls == [{"type": "test"}]
+    assert events.events[0]["status"] == "processed"
+    assert events.events[0]["attempts"] == 1
+
+
+def test_live_lease_is_not_claimed(events, monkeypatch, run):
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload)
+
+    monkeypatch.setitem(wq.handlers, "test", handler)
+    lease_until = datetime.utcnow() + timedelta(seconds=30)
+    events.events.append(event(status="processing", attempts=1, lease_id="other", processing_until=lease_until))
+    run(make_queue()._process("e1"))
+    assert calls == []
+    assert events.events[0]["lease_id"] == "other"
+
+
+def test_expired_lease_is_reclaimed(events, monkeypatch, run):
+    async def handler(payload):
+        pass
+
+    monkeypatch.setitem(wq.handlers, "test", handler)
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    events.events.append(event(status="processing", attempts=1, lease_id="dead", processing_until=expired))
+    run(make_queue()._process("e1"))
+    assert events.events[0]["status"] == "processed"
+    assert events.events[0]["attempts"] == 2
+    assert events.events[0]["lease_id"] != "dead"
+
+
+def test_reclaim_after_last_attempt_fails_the_event(events, run):
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    events.events.append(event(status="processing", attempts=3, lease_id="dead", processing_until=expired))
+    run(make_queue(max_attempts=3)._process("e1"))
+    assert events.events[0]["status"] == "failed"
+    assert events.events[0]["last_error"] == "Lease expired"
+
+
+def test_worker_that_lost_its_lease_cannot_overwrite(events, monkeypatch, run):
+    first, second = make_queue(), make_queue()
+
+    async def handler(payload):
+        if not handler.reclaimed:
+            # The first worker stalls past its lease and another reclaims the event
+            handler.reclaimed = True
+            events.events[0]["processing_until"] = datetime.utcnow() - timedelta(seconds=1)
+            await second._process("e1")
+            raise RuntimeError("late failure")
+
+    handler.reclaimed = False
+    monkeypatch.setitem(wq.handlers, "test", handler)
+    events.events.append(event())
+    run(first._process("e1"))
+    assert events.events[0]["status"] == "processed"
+    assert second.processed == 1
@@ -0,0 +1,86 @@
+# tests/test_write_behind.py
+import asyncio
+from bson import ObjectId
+from pymongo.errors import ConnectionFailure
+from app import write_behind
+from app.cache import user_cache
+from app.write_behind import WriteBehindQueue
+
+
+class SlowCollection:
+    """bulk_write that blocks until released, to catch shutdown mid-write"""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.written = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.started.set()
+        await self.release.wait()
+        self.written.extend(operations)
+
+
+def test_stop_waits_for_flush_in_progress(monkeypatch, run):
+    user_id = ObjectId()
+
+    async def scenario():
+        collection = SlowCollection()
+        monkeypatch.setattr(write_behind.mongodb, "get_collection", lambda name: collection)
+        await user_cache.set(str(user_id), {"id": str(user_id), "name": "old"})
+
+        queue = WriteBehindQueue("users", max_batch=1, interval=60)
+        queue.start()
+        queue.enqueue(user_id, {"name": "new"})
+        await collection.started.wait()
+
+        # Shutdown arrives while bulk_write is still running
+        stopping = asyncio.create_task(queue.stop())
+        await asyncio.sleep(0.01)
+        assert not stopping.done()
+        collection.release.set()
+        await stopping
+
+        assert len(collection.written) == 1
+        assert collection.written[0]._doc == {"$set": {"name": "new"}, "$inc": {"version": 1}}
+        assert queue.depth == 0
+        assert await user_cache.get(str(user_id)) is None
+
+    run(scenario())
+
+
+def test_updates_coalesce_per_document(monkeypatch, run):
+    user_id = ObjectId()
+
+    async def scenario():
+        collection = SlowCollection()
+        collection.release.set()
+        monkeypatch.setattr(write_behind.mongodb, "get_collection", lambda name: collection)
+        queue = WriteBehindQueue("users", max_batch=100, interval=60)
+        queue.enqueue(user_id, {"name": "a", "surname": "s"})
+        queue.enqueue(user_id, {"name": "b"})
+        assert queue.depth == 1
+        await queue.flush()
+        assert [op._doc["$set"] for op in collection.written] == [{"name": "b", "surname": "s"}]
+
+    run(scenario())
+
+
+def test_failed_flush_requeues_under_newer_values(monkeypatch, run):
+    user_id = ObjectId()
+
+    async def scenario():
+        queue = WriteBehindQueue("users", max_batch=100, interval=60)
+
+        class FailingCollection:
+            async def bulk_write(self, operations, ordered=True):
+                # A newer update arrives while the failing write is in flight
+                queue.enqueue(user_id, {"name": "newer"})
+                raise ConnectionFailure("down")
+
+        monkeypatch.setattr(write_behind.mongodb, "get_collection", lambda name: FailingCollection())
+        queue.enqueue(user_id, {"name": "older", "surname": "kept"})
+        await queue.flush()
+        assert queue._pending == {user_id: {"name": "newer", "surname": "kept"}}
+
+    run(scenario())